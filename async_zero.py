@@ -0,0 +1,75 @@
+'''
+    asyncio front end of the .msh reader and writer, for services that
+    must not stall their event loop on a large file:
+
+        root = await async_zero.parse_async('model.msh')
+        async for event, name, depth, offset, payload in async_zero.stream_chunks('model.msh'):
+            ...
+        await async_zero.write_async('copy.msh', root)
+
+    Mapping, reading and decoding the file all run on an executor, the
+    loop only awaits them. executor None is the loop's default thread
+    pool. Decoding holds the GIL, so a thread still takes turns with the
+    loop; parse_async and write_async accept a ProcessPoolExecutor to keep
+    the work out of the loop's process (trees come back pickled, lazy and
+    raw trees and instruments only work on threads). Files are decoded in
+    the array mode by default, like parse_batch: few objects to allocate,
+    to pickle and for the garbage collector to pause every thread over.
+    Nothing is shared between calls, any number of files can be in flight
+    at once.
+'''
+import asyncio
+import functools
+import itertools
+
+try:
+    from . import parse_zero
+    from . import write_zero
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+    import write_zero
+
+# parse_stream events decoded per executor call, the loop runs in between
+STREAM_BATCH = 64
+
+async def parse_async(filepath, executor=None, arrays=True, lazy=False, include=None, exclude=None,
+        instrument=None, limits=None, raw=False):
+    '''parse_zero.parse on executor. A lazy tree decodes a chunk on first
+    access, on whichever thread touches it, loop included.'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(parse_zero.parse, filepath, arrays, lazy,
+        include, exclude, instrument, limits, raw))
+
+def next_events(events, count):
+    # the next count events of a parse_stream generator, fewer at its end
+    return list(itertools.islice(events, count))
+
+async def stream_chunks(filepath, executor=None, arrays=True, include=None, exclude=None, instrument=None,
+        limits=None, batch=STREAM_BATCH):
+    '''parse_zero.parse_stream as an async generator, batch events at a time
+    decoded on executor. The generator keeps its place in the mapped file,
+    so executor has to be a thread pool.'''
+    loop = asyncio.get_running_loop()
+    events = parse_zero.parse_stream(filepath, arrays, include, exclude, instrument, limits)
+    pending = None
+    try:
+        while(True):
+            # shielded, a cancelled consumer must not lose track of the batch still running
+            pending = loop.run_in_executor(executor, next_events, events, batch)
+            chunk_events = await asyncio.shield(pending)
+            for event in chunk_events:
+                yield event
+            if(len(chunk_events) < batch):
+                break
+    finally:
+        # the generator can only be closed once that batch is done
+        if(pending != None and not pending.done()):
+            pending.add_done_callback(lambda future: events.close())
+        else:
+            events.close()
+
+async def write_async(filepath, root, executor=None):
+    '''write_zero.write_file of root to filepath on executor, returns the
+    bytes written. Re-saving a lazy or raw tree over its own file is fine.'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, write_zero.write_file, filepath, root)
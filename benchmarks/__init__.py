@@ -0,0 +1,19 @@
+'''
+    Micro benchmarks for the .msh readers, the CRC and the chunk writer.
+
+    Runs without Blender, on files and payloads built by generate_zero,
+    from the add-on directory:
+
+        python -m benchmarks                         # small and medium inputs
+        python -m benchmarks --sizes huge --only parse
+        python -m benchmarks --save                  # store results as the baseline
+
+    Every case reports its best time over a few repeats, throughput (MB/s
+    and vertices/s, frames/s, strings/s or CRCs/s) and peak traced memory,
+    and is compared with benchmarks/baseline.json. Throughputs are compared
+    relative to a fixed reference workload timed before every case, see
+    runner.run_case. Drops in throughput or growth in peak memory
+    beyond the tolerance are listed, and with --check fail the run:
+
+        python -m benchmarks --check --only parse    # exit status 1 on a regression
+'''
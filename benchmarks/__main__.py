@@ -0,0 +1,47 @@
+import sys
+import json
+import argparse
+
+from . import cases
+from . import runner
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks', description='Benchmark the .msh readers, CRC and writer.')
+    parser.add_argument('--sizes', default='small,medium', help='comma separated, of {0}'.format(', '.join(cases.SIZES)))
+    parser.add_argument('--only', default=None, help='comma separated cases, of {0}'.format(', '.join(cases.CASES)))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run for peak memory')
+    parser.add_argument('--baseline', default=runner.BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=None, help='override the baseline tolerance')
+    parser.add_argument('--save', action='store_true', help='store the results in the baseline')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes.split(',')
+    selected = args.only.split(',') if args.only else list(cases.CASES)
+    baseline = runner.load_baseline(args.baseline)
+
+    results = {}
+    for size in sizes:
+        for case in selected:
+            for name, function, units in cases.CASES[case](size):
+                result = runner.run_case(function, units, args.repeat, not args.no_memory)
+                results[name] = result
+                print(runner.format_result(name, result, runner.expected_result(name, result, baseline)),
+                    flush=True)
+
+    if(args.json):
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=1, sort_keys=True)
+    if(args.save):
+        runner.save_baseline(results, args.baseline)
+        return 0
+
+    regressions = runner.compare(results, baseline, args.tolerance)
+    for name, metric, value, expected in regressions:
+        print('regression: {0} {1} {2:.4g}, baseline {3:.4g}'.format(name, metric, value, expected))
+    return 1 if regressions and args.check else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
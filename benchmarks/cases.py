@@ -0,0 +1,191 @@
+'''
+    Benchmark cases, each yields (name, function, units) for an input size.
+
+    units maps what one call of function processes to its amount, e.g.
+    {'MB':12.5, 'vertices':250000}, and is reported per second.
+'''
+import os
+import io
+import asyncio
+import hashlib
+import tempfile
+import functools
+
+try:
+    from .. import parse_zero
+    from .. import msh2_crc
+    from .. import write_zero
+    from .. import generate_zero
+    from .. import async_zero
+except ImportError: # run from the add-on directory, as top level modules
+    import parse_zero
+    import msh2_crc
+    import write_zero
+    import generate_zero
+    import async_zero
+
+SIZES = {
+    'small':{'models':2, 'segments':1, 'vertices':1024, 'bones':4, 'frames':30,
+        'cloth':1, 'cloth_density':16, 'strings':1000},
+    'medium':{'models':8, 'segments':2, 'vertices':16384, 'bones':16, 'frames':300,
+        'cloth':2, 'cloth_density':64, 'strings':20000},
+    'huge':{'models':8, 'segments':2, 'vertices':65536, 'bones':64, 'frames':1200,
+        'cloth':4, 'cloth_density':128, 'strings':200000},
+}
+
+def generator_params(size):
+    params = dict(SIZES[size])
+    del params['strings']
+    return params
+
+def segment_vertices(size):
+    columns, rows = generate_zero.grid_shape(SIZES[size]['vertices'])
+    return columns*rows
+
+def mesh_vertices(size):
+    return SIZES[size]['models']*SIZES[size]['segments']*segment_vertices(size)
+
+def corpus_file(size, directory=None):
+    # generated once per parameter set and kept in the temp directory
+    params = generator_params(size)
+    directory = directory or os.path.join(tempfile.gettempdir(), 'swbf2_msh_benchmarks')
+    key = hashlib.blake2b(repr(sorted(params.items())).encode(), digest_size=8).hexdigest()
+    filepath = os.path.join(directory, '{0}_{1}.msh'.format(size, key))
+    if(not os.path.exists(filepath)):
+        os.makedirs(directory, exist_ok=True)
+        temp_path = filepath + '.tmp'
+        generate_zero.generate(temp_path, **params)
+        os.replace(temp_path, filepath)
+    return filepath
+
+def parse_cases(size):
+    filepath = corpus_file(size)
+    units = {'MB':os.path.getsize(filepath)/1e6, 'vertices':mesh_vertices(size)}
+    for arrays in (False, True):
+        yield ('parse[{0},{1}]'.format(size, 'arrays' if arrays else 'lists'),
+            functools.partial(parse_zero.parse, filepath, arrays=arrays), units)
+
+async def parse_all_async(filepaths):
+    return await asyncio.gather(*[async_zero.parse_async(filepath) for filepath in filepaths])
+
+def parse_concurrently(filepaths):
+    return asyncio.run(parse_all_async(filepaths))
+
+def parse_async_cases(size):
+    # a few requests for the same file in flight at once, on the loop's thread pool
+    filepaths = [corpus_file(size)]*4
+    units = {'MB':4*os.path.getsize(filepaths[0])/1e6, 'vertices':4*mesh_vertices(size)}
+    yield ('parse_async[{0},x4]'.format(size), functools.partial(parse_concurrently, filepaths), units)
+
+def read_records(payload, count, arrays):
+    # the POSL reader past its count, as the compiled schema reader calls it
+    file = parse_zero.zeroBuffer(payload, 4, arrays=arrays)
+    chunk = parse_zero.zeroChunk('POSL', len(payload), None, 0)
+    return parse_zero.data_records(file, chunk, count, parse_zero.struct_codec('3f'), 3, 'f')
+
+def data_records_cases(size):
+    count = segment_vertices(size)*SIZES[size]['segments']
+    payload = parse_zero.U32.pack(count) + os.urandom(count*12)
+    units = {'MB':len(payload)/1e6, 'vertices':count}
+    for arrays in (False, True):
+        yield ('data_records[{0},{1}]'.format(size, 'arrays' if arrays else 'lists'),
+            functools.partial(read_records, payload, count, arrays), units)
+
+def read_keyframes(payload, arrays):
+    file = parse_zero.zeroBuffer(payload, arrays=arrays)
+    chunk = parse_zero.zeroChunk('KFR3', len(payload), None, 0)
+    return parse_zero.read_keyframes_per_bone(file, chunk)
+
+def keyframe_cases(size):
+    generator = generate_zero.zeroMshGenerator(models=0, bones=SIZES[size]['bones'],
+        frames=SIZES[size]['frames'], cloth=0, materials=0)
+    kfr3 = generator.build().find('KFR3')
+    data = io.BytesIO()
+    write_zero.write_chunk_data(data, kfr3)
+    payload = data.getvalue()
+    units = {'MB':len(payload)/1e6, 'frames':len(kfr3.keyframes)*generator.frames*2}
+    for arrays in (False, True):
+        yield ('read_keyframes_per_bone[{0},{1}]'.format(size, 'arrays' if arrays else 'lists'),
+            functools.partial(read_keyframes, payload, arrays), units)
+
+def read_strings(payload, chunks):
+    file = parse_zero.zeroBuffer(payload)
+    for chunk in chunks:
+        file.seek(chunk.offset)
+        parse_zero.zero_string(file, chunk)
+
+def read_weight_table(payload):
+    file = parse_zero.zeroBuffer(payload)
+    chunk = parse_zero.zeroChunk('FWGT', len(payload), None, 0)
+    return parse_zero.read_cloth_weights(file, chunk)
+
+def zero_string_cases(size):
+    names = ['model_name_{0}'.format(i).encode() for i in range(SIZES[size]['strings'])]
+    payload = bytearray()
+    chunks = []
+    for name in names:
+        data = name + bytes(4-len(name)%4)
+        chunks.append(parse_zero.zeroChunk('NAME', len(data), None, len(payload)))
+        payload += data
+    payload = bytes(payload)
+    units = {'MB':len(payload)/1e6, 'strings':len(names)}
+    yield ('zero_string[{0}]'.format(size), functools.partial(read_strings, payload, chunks), units)
+    # cloth fixed points name one of a few bones each
+    weights = ['bone_{0}'.format(i % SIZES[size]['bones']).encode() for i in range(SIZES[size]['strings'])]
+    payload = parse_zero.U32.pack(len(weights)) + b''.join(name + b'\x00' for name in weights)
+    yield ('read_cloth_weights[{0}]'.format(size), functools.partial(read_weight_table, payload),
+        {'MB':len(payload)/1e6, 'strings':len(weights)})
+
+def crc_all(names):
+    crc = msh2_crc.crc
+    for name in names:
+        crc(name)
+
+def crc_bytes_all(names):
+    crc_bytes = msh2_crc.crc_bytes
+    for name in names:
+        crc_bytes(name)
+
+def crc_cases(size):
+    names = ['bone_{0}_r_{1}'.format(i % 97, i) for i in range(SIZES[size]['strings']*5)]
+    # texture and parent paths, hashed as bytes straight from the file
+    paths = ['textures\\{0}\\model_part_{1}_diffuse_detail.tga'.format(i % 31, i).encode()
+        for i in range(SIZES[size]['strings'])]
+    yield ('msh2_crc.crc[{0}]'.format(size), functools.partial(crc_all, names), {'CRCs':len(names)})
+    yield ('msh2_crc.crc_many[{0}]'.format(size), functools.partial(msh2_crc.crc_many, names), {'CRCs':len(names)})
+    yield ('msh2_crc.crc_many[{0},vectorized]'.format(size),
+        functools.partial(msh2_crc.crc_many, names, vectorized=True), {'CRCs':len(names)})
+    yield ('msh2_crc.crc_bytes[{0}]'.format(size), functools.partial(crc_bytes_all, paths),
+        {'CRCs':len(paths), 'MB':sum(map(len, paths))/1e6})
+
+def write_tree(root):
+    file = io.BytesIO()
+    write_zero.write_recursive(file, root)
+    return file.tell()
+
+def resave(filepath):
+    # untouched chunks are copied from the mapped file as they are
+    root = parse_zero.parse(filepath, lazy=True, raw=True)
+    file = io.BytesIO()
+    write_zero.write_tree(file, root)
+    return file.tell()
+
+def writer_cases(size):
+    for packed in (True, False):
+        root = generate_zero.zeroMshGenerator(packed=packed, **generator_params(size)).build()
+        units = {'MB':(root.size_in_bytes+8)/1e6, 'vertices':mesh_vertices(size)}
+        yield ('write_recursive[{0},{1}]'.format(size, 'packed' if packed else 'lists'),
+            functools.partial(write_tree, root), units)
+    filepath = corpus_file(size)
+    yield ('resave[{0},raw]'.format(size), functools.partial(resave, filepath),
+        {'MB':os.path.getsize(filepath)/1e6, 'vertices':mesh_vertices(size)})
+
+CASES = {
+    'parse':parse_cases,
+    'parse_async':parse_async_cases,
+    'data_records':data_records_cases,
+    'read_keyframes_per_bone':keyframe_cases,
+    'zero_string':zero_string_cases,
+    'crc':crc_cases,
+    'writer':writer_cases,
+}
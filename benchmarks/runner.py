@@ -0,0 +1,125 @@
+'''
+    Timing, peak memory and baseline comparison for the benchmark cases.
+'''
+import os
+import gc
+import json
+import time
+import struct
+import tracemalloc
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# allowed relative drop in throughput and growth in peak memory
+DEFAULT_TOLERANCE = 0.25
+
+def measure(function, repeat=3, memory=True):
+    # best time over repeat calls after a warm up call, then one traced call for peak memory
+    function()
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        best = seconds if best == None else min(best, seconds)
+    peak = None
+    if(memory):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+# fixed work timed with every run, unpacking and summing floats in python like the list mode readers
+REFERENCE_DATA = struct.pack('<65536f', *range(65536))
+
+def reference_work():
+    return sum(value for (value,) in struct.iter_unpack('<f', REFERENCE_DATA))
+
+def reference_speed(repeat=5):
+    # runs of reference_work per second on this machine right now
+    seconds, peak = measure(reference_work, repeat, False)
+    return 1/seconds
+
+def run_case(function, units, repeat=3, memory=True):
+    '''Time function, its throughput in units per second and peak memory.
+
+    The reference_speed timed just before is kept with the result and
+    throughputs are compared relative to it, so a slower or busier machine
+    than the one the baseline was saved on does not read as a regression.
+    '''
+    reference = reference_speed(repeat)
+    seconds, peak = measure(function, repeat, memory)
+    result = {'seconds':seconds, 'reference':reference}
+    for unit, amount in units.items():
+        result['{0}/s'.format(unit)] = amount/seconds if seconds > 0 else float('inf')
+    if(peak != None):
+        result['peak_bytes'] = peak
+    return result
+
+def load_baseline(path=BASELINE_PATH):
+    if(not os.path.exists(path)):
+        return {'tolerance':DEFAULT_TOLERANCE, 'results':{}}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+def save_baseline(results, path=BASELINE_PATH):
+    # merged into the stored results, cases not run this time and per case tolerances are kept
+    baseline = load_baseline(path)
+    for name, result in results.items():
+        tolerance = baseline['results'].get(name, {}).get('tolerance')
+        baseline['results'][name] = result if tolerance == None else dict(result, tolerance=tolerance)
+    baseline['results'] = dict(sorted(baseline['results'].items()))
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+        baseline_file.write('\n')
+
+def expected_result(name, result, baseline):
+    # baseline entry of case name, throughputs scaled from its reference speed to the one of result
+    expected = baseline['results'].get(name)
+    if(expected == None):
+        return None
+    scale = 1.0
+    if(expected.get('reference') and result.get('reference')):
+        scale = result['reference']/expected['reference']
+    return {metric:value*scale if metric.endswith('/s') else value for metric, value in expected.items()}
+
+def compare(results, baseline, tolerance=None):
+    '''Regressions of results against baseline, as (case, metric, value, baseline value).
+
+    Baseline throughputs are scaled by the reference speeds of the run and
+    of the baseline, see run_case. A case entry in the baseline may carry
+    its own 'tolerance', otherwise the baseline's (or the given) tolerance
+    applies.
+    '''
+    regressions = []
+    for name, result in results.items():
+        expected = expected_result(name, result, baseline)
+        if(expected == None):
+            continue
+        allowed = expected.get('tolerance', tolerance if tolerance != None else baseline.get('tolerance', DEFAULT_TOLERANCE))
+        for metric, value in result.items():
+            expected_value = expected.get(metric)
+            if(expected_value == None):
+                continue
+            if(metric.endswith('/s') and value < expected_value*(1-allowed)):
+                regressions.append((name, metric, value, expected_value))
+            elif(metric == 'peak_bytes' and value > expected_value*(1+allowed)):
+                regressions.append((name, metric, value, expected_value))
+    return regressions
+
+def format_result(name, result, expected=None):
+    parts = ['{0:<44}'.format(name), '{0:9.4f}s'.format(result['seconds'])]
+    for metric, value in result.items():
+        if(metric.endswith('/s')):
+            text = '{0:.4g} {1}'.format(value, metric)
+            if(expected and expected.get(metric)):
+                text += ' ({0:+.0%})'.format(value/expected[metric]-1)
+            parts.append(text)
+    if('peak_bytes' in result):
+        parts.append('peak {0:.1f} MB'.format(result['peak_bytes']/1e6))
+    return '  '.join(parts)
@@ -0,0 +1,161 @@
+'''
+    Persistent cache of parsed .msh chunk trees.
+
+    Trees are kept in an in process LRU keyed by path, size and mtime, and
+    on disk as pickled sidecar files named after a hash of the file
+    contents and the parse options, so a touched or copied file still hits.
+    The disk tier is bounded in size, the least recently used sidecars are
+    evicted first.
+
+    Sidecars are pickles and loading one runs whatever it was made to, so
+    they are only kept in a directory of the current user that nobody else
+    can write to. The disk tier is left unused if the directory is not.
+'''
+import os
+import stat
+import pickle
+import hashlib
+import tempfile
+import threading
+import collections
+
+try:
+    from . import parse_zero
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+
+# bump whenever the layout of parsed trees changes
+CACHE_VERSION = 5
+
+CACHE_SUFFIX = '.zpk'
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.swbf2_msh', 'cache')
+
+def private_dir(path):
+    '''True if path is a directory, made if missing, that only the current
+    user can write to. Other users could plant sidecars in anything else.'''
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if(not stat.S_ISDIR(info.st_mode)):
+        return False
+    if(hasattr(os, 'getuid')):
+        return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+    return True
+
+def options_key(arrays, include, exclude):
+    return repr((CACHE_VERSION, bool(arrays),
+        sorted(include) if include != None else None,
+        sorted(exclude) if exclude != None else None))
+
+def content_hash(filepath, options):
+    digest = hashlib.blake2b(options.encode(), digest_size=16)
+    zero_map = parse_zero.map_file(filepath)
+    try:
+        digest.update(zero_map)
+    finally:
+        zero_map.close()
+    return digest.hexdigest()
+
+class zeroParseCache():
+    '''Two tier cache in front of parse_zero.parse.
+
+    Trees handed out are shared between hits and must not be modified.
+    '''
+
+    def __init__(self, cache_dir=None, max_bytes=512*1024*1024, memory_entries=8):
+        self.cache_dir = cache_dir if cache_dir != None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, filepath, arrays=False, include=None, exclude=None):
+        options = options_key(arrays, include, exclude)
+        stat = os.stat(filepath)
+        memory_key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns, options)
+
+        with self._lock:
+            root = self._memory.get(memory_key)
+            if(root != None):
+                self._memory.move_to_end(memory_key)
+                return root
+
+        if(private_dir(self.cache_dir)):
+            sidecar = os.path.join(self.cache_dir, content_hash(filepath, options) + CACHE_SUFFIX)
+            root = self.load_sidecar(sidecar)
+            if(root == None):
+                root = parse_zero.parse(filepath, arrays=arrays, include=include, exclude=exclude)
+                self.store_sidecar(sidecar, root)
+        else:
+            root = parse_zero.parse(filepath, arrays=arrays, include=include, exclude=exclude)
+
+        with self._lock:
+            self._memory[memory_key] = root
+            while(len(self._memory) > self.memory_entries):
+                self._memory.popitem(last=False)
+        return root
+
+    def load_sidecar(self, sidecar):
+        try:
+            with open(sidecar, 'rb') as cache_file:
+                root = pickle.load(cache_file)
+            os.utime(sidecar) # recently used, evicted last
+            return root
+        except Exception:
+            # missing, stale or damaged entry, parse again and overwrite it
+            return None
+
+    def store_sidecar(self, sidecar, root):
+        # caching is best effort, a failed write only costs the next parse
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as cache_file:
+                pickle.dump(root, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, sidecar)
+        except Exception:
+            if(os.path.exists(temp_path)):
+                os.remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if(entry.name.endswith(CACHE_SUFFIX)):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if(total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if(os.path.isdir(self.cache_dir)):
+            for entry in os.scandir(self.cache_dir):
+                if(entry.name.endswith(CACHE_SUFFIX)):
+                    os.remove(entry.path)
+
+default_cache = None
+
+def parse(filepath, arrays=False, include=None, exclude=None):
+    # parse_zero.parse through a cache shared by the whole add-on
+    global default_cache
+    if(default_cache == None):
+        default_cache = zeroParseCache()
+    return default_cache.parse(filepath, arrays=arrays, include=include, exclude=exclude)
@@ -1,7 +1,7 @@
 import bpy
-import struct
 from . import parse_zero
 from . import msh2_crc
+from . import write_zero
 from bpy_extras.io_utils import ExportHelper
 
 MODL_NULL, \
@@ -22,7 +22,7 @@ def build_object(bl_object, parent_chunk):
 
     index = bl_object.ze_object.object_index
     chunk_mndx = parse_zero.zeroChunk('MNDX', 4, modl_chunk)
-    chunk_mndx.data = index
+    chunk_mndx.model_index = index
     modl_chunk.addChild(chunk_mndx)
 
     m_type = bl_object.ze_object.object_type #loop to access index proper
@@ -31,7 +31,7 @@ def build_object(bl_object, parent_chunk):
     m_type = bl_object.ze_object['object_type']
 
     chunk_mtyp = parse_zero.zeroChunk('MTYP', 4, modl_chunk)
-    chunk_mtyp.data = m_type
+    chunk_mtyp.model_type = m_type
     modl_chunk.addChild(chunk_mtyp)
 
     parent = bl_object.parent
@@ -49,14 +49,14 @@ def build_object(bl_object, parent_chunk):
 
     chunk_tran = parse_zero.zeroChunk('TRAN', 40, modl_chunk)
     chunk_tran.scale = scale
-    chunk_tran.rotation = rotation
+    chunk_tran.quaternion = rotation
     chunk_tran.location = location
     modl_chunk.addChild(chunk_tran)
 
     hidden = bl_object.ze_object.hidden
     if(hidden):
         chunk_flgs = parse_zero.zeroChunk('FLGS', 4, modl_chunk)
-        chunk_flgs.data = 1
+        chunk_flgs.flags = 1
         modl_chunk.addChild(chunk_flgs)
 
     #if certain m_type add geometry and segments
@@ -72,7 +72,6 @@ def build_object(bl_object, parent_chunk):
 
             if(len(bl_object.vertex_groups) > 0):
                 chunk_envl = parse_zero.zeroChunk('ENVL', len(bl_object.vertex_groups)*4+4, geom_chunk)
-                chunk_envl.count = len(bl_object.vertex_groups)
                 data = []
                 for group in bl_object.vertex_groups:
                     for o in bpy.context.scene.objects:
@@ -80,7 +79,7 @@ def build_object(bl_object, parent_chunk):
                             data.append(bpy.context.scene.objects[group.name].ze_object.object_index)
                     
                 assert len(data) == len(bl_object.vertex_groups), 'Error: There must be an object of same name for every vertex group'
-                chunk_envl.data = data
+                chunk_envl.envelopes = data
                 geom_chunk.addChild(chunk_envl)
 
             modl_chunk.addChild(geom_chunk)
@@ -98,14 +97,13 @@ def build_object(bl_object, parent_chunk):
             
             if(len(bl_object.vertex_groups) > 0):
                 chunk_envl = parse_zero.zeroChunk('ENVL', len(bl_object.vertex_groups)*4+4, geom_chunk)
-                chunk_envl.count = len(bl_object.vertex_groups)
                 data = []
                 for group in bl_object.vertex_groups:
                     for o in bpy.context.scene.objects:
                         if(group.name == o.name):
                             data.append(bpy.context.scene.objects[group.name].ze_object.object_index)
                 assert len(data) == len(bl_object.vertex_groups), 'Error: There must be an object of same name for every vertex group'
-                chunk_envl.data = data
+                chunk_envl.envelopes = data
                 geom_chunk.addChild(chunk_envl)
 
             geom_chunk.addChild(chunk_bbox)
@@ -117,7 +115,7 @@ def build_object(bl_object, parent_chunk):
     if(coll_prim):
         bl_object.ze_object.collision_type = bl_object.ze_object.collision_type
         chunk_swci = parse_zero.zeroChunk('SWCI', 16, modl_chunk)
-        chunk_swci.type = bl_object.ze_object['collision_type']
+        chunk_swci.coll_type = bl_object.ze_object['collision_type']
         chunk_swci.x = bl_object.ze_object.collision_x
         chunk_swci.y = bl_object.ze_object.collision_y
         chunk_swci.z = bl_object.ze_object.collision_z
@@ -141,9 +139,9 @@ def build_top_level(export_animations):
     chunk_sinf.addChild(chunk_s_name)
 
     chunk_fram = parse_zero.zeroChunk('FRAM', 12, chunk_sinf)
-    chunk_fram.start = scene.frame_start
-    chunk_fram.end = scene.frame_end
-    chunk_fram.rate = scene.render.fps / scene.render.fps_base
+    chunk_fram.start_frame = scene.frame_start
+    chunk_fram.end_frame = scene.frame_end
+    chunk_fram.frame_rate = scene.render.fps / scene.render.fps_base
     chunk_sinf.addChild(chunk_fram)
     chunk_msh2.addChild(chunk_sinf)
 
@@ -200,7 +198,7 @@ def build_material_list(parent_chunk):
         chunk_data = parse_zero.zeroChunk('DATA', 16*3+4, chunk_matd)
         chunk_data.diffuse = mat.ze_material.diffuse[:]
         chunk_data.ambient = mat.ze_material.ambient[:]
-        chunk_data.specular = mat.ze_material.specular[:]
+        chunk_data.specular_color = mat.ze_material.specular[:]
         chunk_data.specular_strength = mat.ze_material.specular_sharpness
 
         chunk_atrb = parse_zero.zeroChunk('ATRB', 4, chunk_matd)
@@ -229,7 +227,6 @@ def build_material_list(parent_chunk):
             chunk_matd.addChild(chunk_tx0d)
 
         chunk_matl.addChild(chunk_matd)
-        chunk_matl.data = len(chunk_matl.children)
 
     return chunk_matl
 
@@ -335,19 +332,16 @@ def build_mesh(bl_object, parent_chunk):
                 final_uv_buffer.append(bl_object.data.uv_layers.active.data[uv_idx].uv[:])
 
         chunk_mati = parse_zero.zeroChunk('MATI', 4, chunk_segm)
-        chunk_mati.data = bl_object.data.materials[poly_seg_list[k][0].material_index].ze_material.index
+        chunk_mati.material_index = bl_object.data.materials[poly_seg_list[k][0].material_index].ze_material.index
 
         chunk_posl = parse_zero.zeroChunk('POSL', (len(final_vertex_buffer)*3*4)+4, chunk_segm)
-        chunk_posl.count = len(final_vertex_buffer)
-        chunk_posl.data = final_vertex_buffer
+        chunk_posl.verts = final_vertex_buffer
 
         chunk_nrml = parse_zero.zeroChunk('NRML', (len(final_normal_buffer*3*4)+4), chunk_segm)
-        chunk_nrml.count = len(final_normal_buffer)
-        chunk_nrml.data = final_normal_buffer
+        chunk_nrml.normals = final_normal_buffer
 
         chunk_ndxt = parse_zero.zeroChunk('NDXT', 4+(  len(final_poly_buffer)*len(final_poly_buffer[0])*2 ), chunk_segm)
-        chunk_ndxt.count = len(final_poly_buffer)
-        chunk_ndxt.data = final_poly_buffer
+        chunk_ndxt.tris = final_poly_buffer
 
         chunk_strp = build_strips(final_poly_buffer, chunk_segm)
 
@@ -360,14 +354,12 @@ def build_mesh(bl_object, parent_chunk):
         chunk_segm.addChild(chunk_strp)
         if(len(bl_object.vertex_groups) > 0):
             chunk_wght = parse_zero.zeroChunk('WGHT', 4+(len(final_weight_buffer)*8), chunk_segm)
-            chunk_wght.count = len(final_weight_buffer)//4
-            chunk_wght.data = final_weight_buffer
+            chunk_wght.weights = final_weight_buffer
             chunk_segm.addChild(chunk_wght)
         
         if(len(bl_object.data.uv_layers) > 0):    
             chunk_uv0l = parse_zero.zeroChunk('UV0L', 4+(len(final_uv_buffer)*4*2), chunk_segm)
-            chunk_uv0l.count = len(final_uv_buffer)
-            chunk_uv0l.data = final_uv_buffer
+            chunk_uv0l.uvs = final_uv_buffer
             chunk_segm.addChild(chunk_uv0l)
 
         chunk_geom.addChild(chunk_segm)
@@ -407,32 +399,23 @@ def build_cloth_mesh(bl_object, chunk_parent):
         weights.append(bl_object.vertex_groups[group].name)
     assert len(weights) == len(bl_object.ze_cloth_fixed_points), 'If there are weights all vertices must be weighted'
 
-    weight_data = b''
-    weight_data += struct.pack('<I', len(weights))
-    for n in weights:
-        weight_data += struct.pack('{}sx'.format(len(n)), n.encode())
-
-    weight_data_size = len(weight_data) + (4 - len(weight_data)%4)
-    for i in range(weight_data_size-len(weight_data)):
-        weight_data += b'\x00'
+    weight_data_size = 4 + sum(len(n)+1 for n in weights)
+    weight_data_size += 4 - weight_data_size%4
 
 
     chunk_cpos = parse_zero.zeroChunk('CPOS', 4+(len(bl_object.data.vertices)*4*3), chunk_clth)
-    chunk_cpos.count = len(verts)
-    chunk_cpos.data = verts
+    chunk_cpos.cloth_verts = verts
 
     chunk_clth.addChild(chunk_cpos)
     
     chunk_cmsh = parse_zero.zeroChunk('CMSH', 4+(len(polys)*4*3), chunk_clth)
-    chunk_cmsh.count = len(polys)
-    chunk_cmsh.data = polys
+    chunk_cmsh.cloth_tris = polys
 
     chunk_clth.addChild(chunk_cmsh)
     
     if(bl_object.data.uv_layers.active != None):
         chunk_cuv0 = parse_zero.zeroChunk('CUV0', 4+len(uv_list)*4*2, chunk_clth)
-        chunk_cuv0.count = len(uv_list)
-        chunk_cuv0.data = uv_list
+        chunk_cuv0.cloth_uvs = uv_list
 
         chunk_clth.addChild(chunk_cuv0)
 
@@ -444,55 +427,45 @@ def build_cloth_mesh(bl_object, chunk_parent):
 
     if(len(bl_object.ze_cloth_fixed_points) > 0):
         chunk_fidx = parse_zero.zeroChunk('FIDX', 4+(len(bl_object.ze_cloth_fixed_points)*4), chunk_clth)
-        chunk_fidx.data = [vert.value for vert in bl_object.ze_cloth_fixed_points]
-        chunk_fidx.count = len(chunk_fidx.data)
+        chunk_fidx.fixed_points = [vert.value for vert in bl_object.ze_cloth_fixed_points]
         chunk_clth.addChild(chunk_fidx)
 
         if(len(bl_object.vertex_groups) > 0):
             chunk_fwgt = parse_zero.zeroChunk('FWGT', weight_data_size, chunk_clth)
-            chunk_fwgt.data = weight_data
-            chunk_fwgt.count = len(chunk_fidx.data)
+            chunk_fwgt.weights = weights
             chunk_clth.addChild(chunk_fwgt)
 
     if(len(bl_object.ze_cloth_stretch_constraints) > 0):
         chunk_sprs = parse_zero.zeroChunk('SPRS', 4+(len(bl_object.ze_cloth_stretch_constraints)*2*2), chunk_clth)
-        chunk_sprs.data = [vert.value[:] for vert in bl_object.ze_cloth_stretch_constraints]
-        chunk_sprs.count = len(chunk_sprs.data)
+        chunk_sprs.stretch_constraints = [vert.value[:] for vert in bl_object.ze_cloth_stretch_constraints]
         chunk_clth.addChild(chunk_sprs)
 
 
     if(len(bl_object.ze_cloth_cross_constraints) > 0):    
         chunk_cprs = parse_zero.zeroChunk('CPRS', 4+(len(bl_object.ze_cloth_cross_constraints)*2*2), chunk_clth)
-        chunk_cprs.data = [vert.value[:] for vert in bl_object.ze_cloth_cross_constraints]
-        chunk_cprs.count = len(chunk_cprs.data)
+        chunk_cprs.cross_constraints = [vert.value[:] for vert in bl_object.ze_cloth_cross_constraints]
         chunk_clth.addChild(chunk_cprs)
 
     if(len(bl_object.ze_cloth_bend_constraints) > 0):
         chunk_bprs = parse_zero.zeroChunk('BPRS', 4+(len(bl_object.ze_cloth_bend_constraints)*2*2), chunk_clth)
-        chunk_bprs.data = [vert.value[:] for vert in bl_object.ze_cloth_bend_constraints]
-        chunk_bprs.count = len(chunk_bprs.data)
+        chunk_bprs.bend_constraints = [vert.value[:] for vert in bl_object.ze_cloth_bend_constraints]
         chunk_clth.addChild(chunk_bprs)
 
     if(len(bl_object.ze_cloth_collision_objects) > 0):
-        data = b''
-        data += struct.pack('<I', len(bl_object.ze_cloth_collision_objects))
+        collisions = []
         for item in bl_object.ze_cloth_collision_objects:
-            data += struct.pack('{}sx'.format(len(item.ob.name)), item.ob.name.encode())
-            data += struct.pack('{}sx'.format(len(item.ob.parent.name)), item.ob.parent.name.encode())
             item.ob_type = item.ob_type
-            data += struct.pack('<I', item['ob_type'])
             if(item.ob_type == 2):
-                data += struct.pack('<3f', item.x/2, item.y/2, item.z/2)
+                x, y, z = item.x/2, item.y/2, item.z/2
             else:
-                data += struct.pack('<3f', item.x, item.y, item.z)
+                x, y, z = item.x, item.y, item.z
+            collisions.append(parse_zero.ZeroClothCollision(item.ob.name, item.ob.parent.name, item['ob_type'], x, y, z))
 
-        data_size = len(data) + (4- len(data)%4)
-        for i in range(data_size - len(data)):
-            data += b'\x00'
+        data_size = 4 + sum(len(coll.ob_name)+len(coll.ob_parent)+2+parse_zero.COLLISION_RECORD.size for coll in collisions)
+        data_size += 4 - data_size%4
 
         chunk_coll = parse_zero.zeroChunk('COLL', data_size, chunk_clth)
-        chunk_coll.count = len(bl_object.ze_cloth_collision_objects)
-        chunk_coll.data = data
+        chunk_coll.collisions = collisions
         chunk_clth.addChild(chunk_coll)
     
     chunk_geom.addChild(chunk_clth)
@@ -541,9 +514,7 @@ def build_shadow_mesh(bl_object, chunk_parent):
 
     shadow_size = 8+(len(final_vertices)*4*3)+(len(final_half_edges)*2*4)
     chunk_shdw= parse_zero.zeroChunk('SHDW', shadow_size, chunk_geom)
-    chunk_shdw.num_verts = len(final_vertices)
     chunk_shdw.verts = final_vertices
-    chunk_shdw.num_edges = len(final_half_edges)
     chunk_shdw.edges = final_half_edges
 
     chunk_geom.addChild(chunk_shdw)
@@ -552,7 +523,6 @@ def build_shadow_mesh(bl_object, chunk_parent):
 
 def build_strips(polys, chunk_parent):
     strips = []
-    data = b''
     """
     new_strip = True
     temp_strip = []
@@ -592,12 +562,9 @@ def build_strips(polys, chunk_parent):
         tri[1] = tri[1] | 0x8000
         strips.append(tri)
         
-    for strp in strips:
-        data += struct.pack('<{}H'.format(len(strp)), *strp)
-
-    chunk_strp = parse_zero.zeroChunk('STRP', len(data)+4, chunk_parent)
-    chunk_strp.count = len(data)//2
-    chunk_strp.data = data
+    indices = [index for strp in strips for index in strp]
+    chunk_strp = parse_zero.zeroChunk('STRP', len(indices)*2+4, chunk_parent)
+    chunk_strp.strips = indices
     return chunk_strp
 
 def get_local_bounding_box(bl_object):
@@ -690,14 +657,14 @@ def build_animation_data(root_chunk):
 
     skeleton_data = []
     blend_factor_data = []
-    keyframe_data = b''
+    keyframe_data = []
     obj_list = [obj for obj in bpy.context.scene.objects if \
         obj.ze_object.chain_object == True and obj.type == 'MESH' \
         or obj.ze_object.chain_object == True and obj.type == 'EMPTY']
     for obj in obj_list:
         crc = msh2_crc.crc(obj.name)
-        skeleton_data.append((crc, 0, obj.ze_object.constraint, 0, 0))
-        blend_factor_data.append((crc, obj.ze_object.blend_factor))
+        skeleton_data.append(parse_zero.Zero_Bone(crc, 0, obj.ze_object.constraint, 0, 0))
+        blend_factor_data.append(parse_zero.Zero_Blend(crc, obj.ze_object.blend_factor))
         assert obj.animation_data != None, 'No animation data for chain item: {}'.format(obj.name)
         act = obj.animation_data.action
         location_data = [f for f in act.fcurves if f.data_path == 'location']
@@ -728,37 +695,28 @@ def build_animation_data(root_chunk):
             rot_keys.append((rot_x, rot_y, rot_z, rot_w))
 
 
-        keyframe_data += struct.pack('<2I', crc, 0) # second arg 0 is keyframe type
-        keyframe_data += struct.pack('<2I', len(loc_keys), len(rot_keys))
-        for i in range(len(loc_keys)):
-            keyframe_data += struct.pack('<I3f', i, *loc_keys[i])
-        for i in range(len(rot_keys)):
-            keyframe_data += struct.pack('<I4f', i, *rot_keys[i])
-    
+        keyframe_data.append(parse_zero.zeroKeyFrameData(crc, 0, len(loc_keys), len(rot_keys), # 0 is the keyframe type
+            [parse_zero.zeroFrame(i, key) for i, key in enumerate(loc_keys)],
+            [parse_zero.zeroFrame(i, key) for i, key in enumerate(rot_keys)]))
+    keyframe_size = sum(parse_zero.KEYFRAME_HEADER.size +
+        keys.num_translation_frames*parse_zero.TRANSLATION_FRAME.size +
+        keys.num_rotation_frames*parse_zero.ROTATION_FRAME.size for keys in keyframe_data)
+
     chunk_skl2 = parse_zero.zeroChunk('SKL2', 4+len(skeleton_data)*4*5, root_chunk)
-    chunk_skl2.count = len(skeleton_data)
-    chunk_skl2.data = skeleton_data
+    chunk_skl2.bones = skeleton_data
 
     chunk_bln2 = parse_zero.zeroChunk('BLN2', 4+len(blend_factor_data)*8, root_chunk)
-    chunk_bln2.count = len(blend_factor_data)
-    chunk_bln2.data = blend_factor_data
+    chunk_bln2.values = blend_factor_data
 
     chunk_anm2 = parse_zero.zeroChunk('ANM2', 0, root_chunk)
 
     chunk_cycl = parse_zero.zeroChunk('CYCL', 4*5+64, root_chunk)
-    chunk_cycl.count = 1
-    chunk_cycl.ani_name = 'fullanimation' # length 13
-    chunk_cycl.frame_rate = bpy.context.scene.render.fps / \
-        bpy.context.scene.render.fps_base
-
-    chunk_cycl.play_style = 0
-    chunk_cycl.first_frame = bpy.context.scene.frame_start
-    chunk_cycl.last_frame = bpy.context.scene.frame_end
+    frame_rate = bpy.context.scene.render.fps / bpy.context.scene.render.fps_base
+    chunk_cycl.animations = [parse_zero.zeroAnimationData('fullanimation', frame_rate, 0,
+        bpy.context.scene.frame_start, bpy.context.scene.frame_end)]
 
-    
-    chunk_kfr3 = parse_zero.zeroChunk('KFR3', 4+len(keyframe_data), root_chunk)
-    chunk_kfr3.count = len(skeleton_data)
-    chunk_kfr3.data = keyframe_data
+    chunk_kfr3 = parse_zero.zeroChunk('KFR3', 4+keyframe_size, root_chunk)
+    chunk_kfr3.keyframes = keyframe_data
 
     chunk_anm2.addChild(chunk_cycl)
     chunk_anm2.addChild(chunk_kfr3)
@@ -769,56 +727,11 @@ def build_animation_data(root_chunk):
 
 
 
-def write_chunk(file, chunk, dict_formats):
-    write_chunk_tag(file, chunk)
-    write_chunk_data(file, chunk, dict_formats)
-
-def write_chunk_tag(file, chunk):
-    file.write(struct.pack('<4sI', chunk.name.encode(), chunk.size_in_bytes))
-
-def write_chunk_data(file, chunk, dict_formats, pad_string = True):
-    if(dict_formats != None):
-        for key in dict_formats.keys():
-            if(key in chunk.__dict__.keys()):
-                if(isinstance(chunk.__dict__[key], list)):
-                    for item in chunk.__dict__[key]:
-                        if(isinstance(item, tuple)):    
-                            file.write(struct.pack('<{0}'.format(dict_formats[key]),
-                            *item))
-                        else:
-                            file.write(struct.pack('<{0}'.format(dict_formats[key]),
-                            item))
-                elif(isinstance(chunk.__dict__[key], str)):
-                    if(pad_string == True):
-                        file.write(struct.pack(dict_formats[key].format(len(chunk.__dict__[key]),
-                        4-len(chunk.__dict__[key])%4), chunk.__dict__[key].encode()))
-                    else:
-                        file.write(struct.pack(dict_formats[key].format(len(chunk.__dict__[key])), chunk.__dict__[key].encode()))
-                
-                elif(isinstance(chunk.__dict__[key], bytes)):
-                    file.write(chunk.__dict__[key])
-
-                else:
-                    if(isinstance(chunk.__dict__[key], tuple)):
-                        file.write(struct.pack('<{0}'.format(dict_formats[key]),
-                        *chunk.__dict__[key]))
-                    else:
-                        file.write(struct.pack('<{0}'.format(dict_formats[key]),
-                        chunk.__dict__[key]))
-
-
 def write_msh_to_file(filepath, export_animations):
     with open(filepath, 'wb') as file:
         root_chunk = build_top_level(export_animations)
         root_chunk.update_size_from_children()
-        write_recursive(file, root_chunk, None)
-
-def write_recursive(file, chunk, dict_formats):
-    #print('Exporting: \n{0}\n'.format(chunk))
-    write_chunk(file, chunk, parse_zero.zero_id_dict[chunk.name][1])
-    if(chunk.children):
-        for child in chunk.children:
-            write_recursive(file, child, parse_zero.zero_id_dict[chunk.name][1])
+        write_zero.write_recursive(file, root_chunk)
 
 class ExportZero(bpy.types.Operator, ExportHelper):
     bl_idname = 'scene_zero.exportfile'
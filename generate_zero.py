@@ -0,0 +1,339 @@
+'''
+    Synthetic .msh files for scale and benchmark testing.
+
+    Builds chunk trees with the layout export_zero writes: HEDR/MSH2 with
+    SINF, MATL and MODL chunks (a bone chain, meshes split into SEGM chunks
+    and cloth), then SKL2, BLN2 and ANM2 with CYCL and KFR3, and writes them
+    with write_zero. Data comes from a seeded numpy generator, the same
+    parameters always give the same bytes. Runs without bpy:
+
+        python -m generate_zero out.msh --models 8 --segments 4 --vertices 60000
+        python -m generate_zero corpus_dir --count 100 --seed 1
+'''
+import os
+import sys
+import argparse
+import numpy
+
+try:
+    from . import parse_zero
+    from . import msh2_crc
+    from . import write_zero
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+    import msh2_crc
+    import write_zero
+
+MODL_NULL, \
+MODL_GEODYNAMIC, \
+MODL_CLOTH, \
+MODL_BONE, \
+MODL_GEOBONE, \
+MODL_GEOSTATIC, \
+MODL_GEOSHADOW = range(7)
+
+# NDXT and the cloth constraints index vertices with 16 bits
+MAX_SEGMENT_VERTICES = 0x10000
+
+def add_chunk(parent, name, size, **fields):
+    chunk = parse_zero.zeroChunk(name, size, parent)
+    parse_zero.update_chunk_dict(chunk, **fields)
+    if(parent != None):
+        parent.addChild(chunk)
+    return chunk
+
+def add_string(parent, name, text):
+    return add_chunk(parent, name, len(text)+(4-len(text)%4), data=text)
+
+def padded_size(size):
+    # zero terminated string tables are padded like strings, always by at least one byte
+    return size + 4-size%4
+
+def grid_shape(vertices):
+    # columns and rows of a grid of about this many vertices
+    columns = max(2, int(round(vertices**0.5)))
+    rows = max(2, -(-vertices//columns))
+    return columns, rows
+
+def grid_indices(columns, rows):
+    return numpy.arange(columns*rows, dtype=numpy.uint32).reshape(rows, columns)
+
+def grid_triangles(columns, rows):
+    # two triangles per cell
+    grid = grid_indices(columns, rows)
+    a, b = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel()
+    c, d = grid[1:, :-1].ravel(), grid[1:, 1:].ravel()
+    triangles = numpy.empty((len(a)*2, 3), dtype=numpy.uint32)
+    triangles[0::2] = numpy.stack((a, c, b), axis=1)
+    triangles[1::2] = numpy.stack((b, c, d), axis=1)
+    return triangles
+
+def grid_pairs(grid, step):
+    # neighbours step apart along rows and columns
+    return numpy.concatenate((
+        numpy.stack((grid[:, :-step].ravel(), grid[:, step:].ravel()), axis=1),
+        numpy.stack((grid[:-step].ravel(), grid[step:].ravel()), axis=1)))
+
+def bounding_box(positions):
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    center = tuple(float(value) for value in (low+high)/2)
+    extents = tuple(float(value) for value in (high-low)/2)
+    return center, extents, min(extents)
+
+class zeroMshGenerator():
+    '''Parameters of a synthetic .msh file.
+
+    models mesh models of segments SEGM chunks each, every segment a grid
+    of about vertices vertices (at most MAX_SEGMENT_VERTICES). bones bone
+    models in a chain that all mesh vertices are weighted to, animated over
+    frames frames. cloth cloth models of cloth_density by cloth_density
+    vertices. With packed set, vertex data is handed to the writer as numpy
+    arrays, otherwise as lists of tuples like export_zero builds.
+    '''
+
+    def __init__(self, models=4, segments=1, vertices=1024, bones=4, frames=30, cloth=1, cloth_density=16,
+            materials=2, seed=0, packed=True):
+        assert materials > 0 or models == 0, 'meshes need a material'
+        assert grid_shape(vertices)[0]*grid_shape(vertices)[1] <= MAX_SEGMENT_VERTICES, \
+            'at most {0} vertices per segment'.format(MAX_SEGMENT_VERTICES)
+        assert 2 <= cloth_density and cloth_density**2 <= MAX_SEGMENT_VERTICES, 'cloth density out of range'
+        self.models = models
+        self.segments = segments
+        self.vertices = vertices
+        self.bones = bones
+        self.frames = frames
+        self.cloth = cloth
+        self.cloth_density = cloth_density
+        self.materials = materials
+        self.seed = seed
+        self.packed = packed
+
+    def build(self):
+        rng = numpy.random.default_rng(self.seed)
+        hedr = add_chunk(None, 'HEDR', 0)
+        msh2 = add_chunk(hedr, 'MSH2', 0)
+        self.build_scene_info(msh2)
+        self.build_materials(msh2)
+
+        bone_names = ['bone_{0}'.format(i) for i in range(self.bones)]
+        index = 1
+        for i, name in enumerate(bone_names):
+            self.build_model(msh2, name, index, MODL_BONE, bone_names[i-1] if i else None, (0.0, 1.0, 0.0))
+            index += 1
+        for i in range(self.models):
+            self.build_mesh(rng, msh2, 'mesh_{0}'.format(i), index, bone_names)
+            index += 1
+        for i in range(self.cloth):
+            self.build_cloth(rng, msh2, 'cloth_{0}'.format(i), index, bone_names)
+            index += 1
+
+        if(self.bones and self.frames):
+            self.build_animation(rng, hedr, bone_names)
+        add_chunk(hedr, 'CL1L', 0)
+        hedr.update_size_from_children()
+        return hedr
+
+    def write(self, filepath):
+        root = self.build()
+        with open(filepath, 'wb') as file:
+            write_zero.write_recursive(file, root)
+        return root.size_in_bytes+8
+
+    def records(self, array):
+        # counted chunk records, as an array or as lists
+        if(self.packed):
+            return array
+        if(array.dtype.names == None and array.ndim > 1):
+            return [tuple(record) for record in array.tolist()]
+        return array.tolist()
+
+    def add_records(self, parent, name, field, array, record_size):
+        return add_chunk(parent, name, 4+len(array)*record_size, **{field:self.records(array)})
+
+    def build_scene_info(self, msh2):
+        sinf = add_chunk(msh2, 'SINF', 0)
+        add_string(sinf, 'NAME', 'synthetic_{0}'.format(self.seed))
+        add_chunk(sinf, 'FRAM', 12, start_frame=0, end_frame=max(self.frames-1, 0), frame_rate=29.97)
+        add_chunk(sinf, 'BBOX', 44, rotation=(0.0, 0.0, 0.0, 1.0), center=(0.0, 0.0, 0.0),
+            extents=(1.0, 1.0, 1.0), radius=1.0)
+
+    def build_materials(self, msh2):
+        matl = add_chunk(msh2, 'MATL', 4)
+        for i in range(self.materials):
+            matd = add_chunk(matl, 'MATD', 0)
+            add_string(matd, 'NAME', 'material_{0}'.format(i))
+            add_chunk(matd, 'DATA', 52, diffuse=(1.0, 1.0, 1.0, 1.0), ambient=(0.5, 0.5, 0.5, 1.0),
+                specular_color=(1.0, 1.0, 1.0, 1.0), specular_strength=50.0)
+            add_chunk(matd, 'ATRB', 4, flags=0, render_type=0, data0=0, data1=0)
+            add_string(matd, 'TX0D', 'texture_{0}.tga'.format(i))
+
+    def build_model(self, msh2, name, index, model_type, parent_name, location):
+        modl = add_chunk(msh2, 'MODL', 0)
+        add_string(modl, 'NAME', name)
+        add_chunk(modl, 'MNDX', 4, model_index=index)
+        add_chunk(modl, 'MTYP', 4, model_type=model_type)
+        if(parent_name != None):
+            add_string(modl, 'PRNT', parent_name)
+        add_chunk(modl, 'TRAN', 40, scale=(1.0, 1.0, 1.0), quaternion=(0.0, 0.0, 0.0, 1.0), location=location)
+        return modl
+
+    def build_envelope(self, geom, bone_names):
+        # bones are the first models, MNDX 1 to len(bone_names)
+        if(bone_names):
+            add_chunk(geom, 'ENVL', 4+len(bone_names)*4, envelopes=list(range(1, len(bone_names)+1)))
+
+    def build_mesh(self, rng, msh2, name, index, bone_names):
+        modl = self.build_model(msh2, name, index, MODL_GEODYNAMIC, bone_names[0] if bone_names else None,
+            (float(index), 0.0, 0.0))
+        geom = add_chunk(modl, 'GEOM', 0)
+        columns, rows = grid_shape(self.vertices)
+        count = columns*rows
+        triangles = grid_triangles(columns, rows).astype('<u2')
+        grid = grid_indices(columns, rows)
+        uvs = numpy.empty((count, 2), dtype='<f4')
+        uvs[:, 0] = (grid % columns).ravel()/(columns-1)
+        uvs[:, 1] = (grid // columns).ravel()/(rows-1)
+        strips = triangles.copy()
+        strips[:, :2] |= 0x8000 # every triangle starts a strip, as export_zero.build_strips writes them
+        normals = numpy.zeros((count, 3), dtype='<f4')
+        normals[:, 1] = 1.0
+
+        bounds = []
+        for segment in range(self.segments):
+            positions = numpy.empty((count, 3), dtype='<f4')
+            positions[:, 0] = uvs[:, 0]
+            positions[:, 1] = rng.random(count, dtype=numpy.float32)*0.05 + segment
+            positions[:, 2] = uvs[:, 1]
+            bounds.append(positions.min(axis=0))
+            bounds.append(positions.max(axis=0))
+
+            segm = add_chunk(geom, 'SEGM', 0)
+            add_chunk(segm, 'MATI', 4, material_index=segment % self.materials)
+            self.add_records(segm, 'POSL', 'verts', positions, 12)
+            self.add_records(segm, 'NRML', 'normals', normals, 12)
+            self.add_records(segm, 'NDXT', 'tris', triangles, 6)
+            self.add_records(segm, 'STRP', 'strips', strips.ravel(), 2)
+            if(bone_names):
+                weights = numpy.empty(count*4, dtype=parse_zero.WEIGHT_DTYPE)
+                weights['index'] = rng.integers(0, len(bone_names), count*4)
+                values = rng.random((count, 4), dtype=numpy.float32)
+                weights['weight'] = (values/values.sum(axis=1, keepdims=True)).ravel()
+                add_chunk(segm, 'WGHT', 4+count*32, weights=self.records(weights))
+            self.add_records(segm, 'UV0L', 'uvs', uvs, 8)
+
+        center, extents, radius = bounding_box(numpy.array(bounds))
+        add_chunk(geom, 'BBOX', 44, rotation=(0.0, 0.0, 0.0, 1.0), center=center, extents=extents, radius=radius)
+        self.build_envelope(geom, bone_names)
+
+    def build_cloth(self, rng, msh2, name, index, bone_names):
+        modl = self.build_model(msh2, name, index, MODL_CLOTH, bone_names[0] if bone_names else None,
+            (0.0, float(index), 0.0))
+        geom = add_chunk(modl, 'GEOM', 0)
+        clth = add_chunk(geom, 'CLTH', 0)
+        density = self.cloth_density
+        grid = grid_indices(density, density)
+        count = density*density
+
+        positions = numpy.empty((count, 3), dtype='<f4')
+        positions[:, 0] = (grid % density).ravel()/(density-1)
+        positions[:, 1] = -(grid // density).ravel()/(density-1)
+        positions[:, 2] = rng.random(count, dtype=numpy.float32)*0.01
+        uvs = numpy.ascontiguousarray(positions[:, :2]*(1.0, -1.0))
+        self.add_records(clth, 'CPOS', 'cloth_verts', positions, 12)
+        self.add_records(clth, 'CMSH', 'cloth_tris', grid_triangles(density, density).astype('<u4'), 12)
+        self.add_records(clth, 'CUV0', 'cloth_uvs', uvs.astype('<f4'), 8)
+        add_string(clth, 'CTEX', 'cloth_{0}.tga'.format(index))
+
+        # the top row hangs from the first bone
+        fixed = grid[0].astype('<u4')
+        self.add_records(clth, 'FIDX', 'fixed_points', fixed, 4)
+        if(bone_names):
+            weights = [bone_names[0]]*len(fixed)
+            add_chunk(clth, 'FWGT', padded_size(4+sum(len(name)+1 for name in weights)), weights=weights)
+        self.add_records(clth, 'SPRS', 'stretch_constraints', grid_pairs(grid, 1).astype('<u2'), 4)
+        cross = numpy.concatenate((
+            numpy.stack((grid[:-1, :-1].ravel(), grid[1:, 1:].ravel()), axis=1),
+            numpy.stack((grid[:-1, 1:].ravel(), grid[1:, :-1].ravel()), axis=1)))
+        self.add_records(clth, 'CPRS', 'cross_constraints', cross.astype('<u2'), 4)
+        if(density > 2):
+            self.add_records(clth, 'BPRS', 'bend_constraints', grid_pairs(grid, 2).astype('<u2'), 4)
+
+        # collision spheres on the bones below the first
+        collisions = [parse_zero.ZeroClothCollision(bone, bone_names[i], 0, 0.1, 0.1, 0.1)
+            for i, bone in enumerate(bone_names[1:3])]
+        if(collisions):
+            size = 4 + sum(len(coll.ob_name)+len(coll.ob_parent)+2+parse_zero.COLLISION_RECORD.size for coll in collisions)
+            add_chunk(clth, 'COLL', padded_size(size), collisions=collisions)
+
+        self.build_envelope(geom, bone_names)
+        center, extents, radius = bounding_box(positions)
+        add_chunk(geom, 'BBOX', 44, rotation=(0.0, 0.0, 0.0, 1.0), center=center, extents=extents, radius=radius)
+
+    def build_animation(self, rng, hedr, bone_names):
+        crcs = [msh2_crc.crc(name) for name in bone_names]
+        skeleton = [parse_zero.Zero_Bone(crc, 0, 0.0, 0.0, 0.0) for crc in crcs]
+        add_chunk(hedr, 'SKL2', 4+len(skeleton)*20, bones=skeleton)
+        blend_factors = [parse_zero.Zero_Blend(crc, 0.5) for crc in crcs]
+        add_chunk(hedr, 'BLN2', 4+len(blend_factors)*8, values=blend_factors)
+
+        anm2 = add_chunk(hedr, 'ANM2', 0)
+        add_chunk(anm2, 'CYCL', 4*5+64,
+            animations=[parse_zero.zeroAnimationData('fullanimation', 29.97, 0, 0, self.frames-1)])
+
+        keyframes = []
+        for crc in crcs:
+            translations = numpy.empty(self.frames, dtype=parse_zero.TRANSLATION_FRAME_DTYPE)
+            translations['index'] = numpy.arange(self.frames)
+            translations['data'] = rng.random((self.frames, 3), dtype=numpy.float32)
+            rotations = numpy.empty(self.frames, dtype=parse_zero.ROTATION_FRAME_DTYPE)
+            rotations['index'] = numpy.arange(self.frames)
+            quaternions = rng.normal(size=(self.frames, 4))
+            rotations['data'] = quaternions/numpy.linalg.norm(quaternions, axis=1, keepdims=True)
+            keyframes.append(parse_zero.zeroKeyFrameData(crc, 0, self.frames, self.frames,
+                parse_zero.zeroFrameColumns(translations), parse_zero.zeroFrameColumns(rotations)))
+        size = len(crcs)*(parse_zero.KEYFRAME_HEADER.size +
+            self.frames*(parse_zero.TRANSLATION_FRAME.size + parse_zero.ROTATION_FRAME.size))
+        add_chunk(anm2, 'KFR3', 4+size, keyframes=keyframes)
+
+def generate(filepath, **params):
+    # writes one file, returns its size in bytes
+    return zeroMshGenerator(**params).write(filepath)
+
+def generate_corpus(directory, count, seed=0, **params):
+    # count files with consecutive seeds, returns their paths
+    os.makedirs(directory, exist_ok=True)
+    filepaths = []
+    for i in range(count):
+        filepath = os.path.join(directory, 'synthetic_{0:04d}.msh'.format(i))
+        generate(filepath, seed=seed+i, **params)
+        filepaths.append(filepath)
+    return filepaths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='generate_zero', description='Write synthetic .msh files.')
+    parser.add_argument('output', help='.msh file, or directory with --count')
+    parser.add_argument('--count', type=int, default=None, help='write a corpus of this many files')
+    parser.add_argument('--models', type=int, default=4)
+    parser.add_argument('--segments', type=int, default=1)
+    parser.add_argument('--vertices', type=int, default=1024, help='vertices per segment')
+    parser.add_argument('--bones', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--cloth', type=int, default=1)
+    parser.add_argument('--cloth-density', type=int, default=16)
+    parser.add_argument('--materials', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lists', action='store_true', help='hand vertex data to the writer as lists')
+    args = parser.parse_args(argv)
+
+    params = dict(models=args.models, segments=args.segments, vertices=args.vertices, bones=args.bones,
+        frames=args.frames, cloth=args.cloth, cloth_density=args.cloth_density, materials=args.materials,
+        packed=not args.lists)
+    if(args.count == None):
+        print(args.output, generate(args.output, seed=args.seed, **params))
+    else:
+        for filepath in generate_corpus(args.output, args.count, seed=args.seed, **params):
+            print(filepath, os.path.getsize(filepath))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
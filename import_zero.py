@@ -1,4 +1,5 @@
 from . import parse_zero
+from . import cache_zero
 import bpy
 import mathutils
 from bpy_extras.io_utils import ImportHelper
@@ -45,8 +46,36 @@ def convert_trans(trans):
 
 
 
-def load(filepath, load_objects=True, load_animations=False, clear_scene=True):
-    root = parse_zero.parse(filepath)
+crc_dictionary = None
+
+def known_crc_names():
+    # names seen by earlier imports, kept at msh2_crc.default_index_path()
+    global crc_dictionary
+    if(crc_dictionary == None):
+        crc_dictionary = msh2_crc.CRCIndex()
+        path = msh2_crc.default_index_path()
+        if(os.path.exists(path)):
+            try:
+                crc_dictionary = msh2_crc.CRCIndex.load(path)
+            except (OSError, ValueError):
+                pass
+    return crc_dictionary
+
+def remember_crc_names(names):
+    dictionary = known_crc_names()
+    count = len(dictionary)
+    dictionary.merge(names)
+    if(len(dictionary) != count):
+        try:
+            dictionary.save(msh2_crc.default_index_path())
+        except OSError:
+            pass
+
+def load(filepath, load_objects=True, load_animations=False, clear_scene=True, remember_names=False):
+    # remember_names keeps the scene's names for later imports, and lets animations
+    # use the names kept by earlier ones, see known_crc_names
+    # animations only need the scene info and ANM2, skip decoding geometry
+    root = cache_zero.parse(filepath, include=None if load_objects else {'SINF', 'ANM2'})
 
     if(clear_scene):
         for bmsh in bpy.data.meshes:
@@ -60,17 +89,10 @@ def load(filepath, load_objects=True, load_animations=False, clear_scene=True):
 
     if(load_objects):    
         model_data = parse_zero.select_chunk_from_id('MSH2', root)
-        model_index_list = []
-        material_index_list = []
-
-        for child in model_data.children:
-            if(child.name == 'MATL'):
-                if(child.children):
-                    for mat in child.children:
-                        if(mat.name == 'MATD'):
-                            material_index_list.append(mat)
-            if(child.name == 'MODL'):
-                model_index_list.append(child)
+        model_index_list = model_data.select('MODL')
+        material_index_list = model_data.select('MATL/MATD')
+        skel = parse_zero.select_chunk_from_id('SKL2', root)
+        blen = parse_zero.select_chunk_from_id('BLN2', root)
         
         for i in range(len(material_index_list)):
             mat = material_index_list[i]
@@ -168,9 +190,6 @@ def load(filepath, load_objects=True, load_animations=False, clear_scene=True):
                 obj.ze_object.collision_x = m_collision.x
                 obj.ze_object.collision_y = m_collision.y
                 obj.ze_object.collision_z = m_collision.z
-                
-            skel = parse_zero.select_chunk_from_id('SKL2', root)
-            blen = parse_zero.select_chunk_from_id('BLN2', root)
 
             if(obj):
                 bpy.context.scene.collection.objects.link(obj)
@@ -189,23 +208,26 @@ def load(filepath, load_objects=True, load_animations=False, clear_scene=True):
                     c.y = coll.collisions[i].y
                     c.z = coll.collisions[i].z
         
-        for obj in bpy.data.objects:
-            if(skel):
-                for bone in skel.bones:
-                    if(msh2_crc.crc(obj.name) == bone.crc):
-                        obj.ze_object.chain_object = True
-                        obj.ze_object.constraint = bone.constrain
-                        break
-            if(blen):
-                for wgt in blen.values:
-                    if(msh2_crc.crc(obj.name) == wgt.crc):
-                        obj.ze_object.blend_factor = wgt.value
-                        break
+        scene_names = msh2_crc.CRCIndex(obj.name for obj in bpy.data.objects)
+        if(skel):
+            # the first bone with an object's crc applies, as before
+            for bone in reversed(skel.bones):
+                name = scene_names.get(bone.crc)
+                if(name != None):
+                    bpy.data.objects[name].ze_object.chain_object = True
+                    bpy.data.objects[name].ze_object.constraint = bone.constrain
+        if(blen):
+            for wgt in reversed(blen.values):
+                name = scene_names.get(wgt.crc)
+                if(name != None):
+                    bpy.data.objects[name].ze_object.blend_factor = wgt.value
+        if(remember_names):
+            remember_crc_names(scene_names)
 
         create_armature_from_model_list(model_index_list)
 
     if(load_animations):
-        load_animation(root)
+        load_animation(root, remember_names)
 
 def create_null_object(model):
     name = parse_zero.select_chunk_from_id('NAME', model).data
@@ -507,12 +529,7 @@ def create_shadow_object(model):
 
 def create_mesh(model):
 
-    material_index_list = []
-    for child in model.parent.children:
-        if(child.name == 'MATL'):
-            for mat in child.children:
-                if(mat.name == 'MATD'):
-                    material_index_list.append(mat)
+    material_index_list = model.parent.select('MATL/MATD')
     
     name = parse_zero.select_chunk_from_id('NAME', model).data
     new_mesh = bpy.data.meshes.new(name)
@@ -530,37 +547,36 @@ def create_mesh(model):
 
     geometry_data = parse_zero.select_chunk_from_id('GEOM', model)
     if(geometry_data):
-        for child in geometry_data.children:
-            if(child.name == 'SEGM'):
-                vert_seg = parse_zero.select_chunk_from_id('POSL', child).verts
-                convert_vert = [(x,-z, y) for x, y, z in vert_seg]
-
-                mati = parse_zero.select_chunk_from_id('MATI', child).material_index
-                mat_segm_list.append(mati)
-                print(mati, name)
-
-                off = triangle_index_offset
-                tri_seg = parse_zero.select_chunk_from_id('NDXT', child).tris
-                convert_tri = [ (t1+off, t2+off, t3+off) for t1, t2, t3 in tri_seg]
-                triangle_index_offset += len(vert_seg)
-
-                uv_seg = parse_zero.select_chunk_from_id('UV0L', child)
-                if(uv_seg):
-                    if(uv_buffer):
-                        uv_buffer.extend(uv_seg.uvs)
-                    else:
-                        uv_buffer = []
-                        uv_buffer.extend(uv_seg.uvs)
+        for child in geometry_data.select('SEGM'):
+            vert_seg = parse_zero.select_chunk_from_id('POSL', child).verts
+            convert_vert = [(x,-z, y) for x, y, z in vert_seg]
+
+            mati = parse_zero.select_chunk_from_id('MATI', child).material_index
+            mat_segm_list.append(mati)
+            print(mati, name)
+
+            off = triangle_index_offset
+            tri_seg = parse_zero.select_chunk_from_id('NDXT', child).tris
+            convert_tri = [ (t1+off, t2+off, t3+off) for t1, t2, t3 in tri_seg]
+            triangle_index_offset += len(vert_seg)
+
+            uv_seg = parse_zero.select_chunk_from_id('UV0L', child)
+            if(uv_seg):
+                if(uv_buffer):
+                    uv_buffer.extend(uv_seg.uvs)
+                else:
+                    uv_buffer = []
+                    uv_buffer.extend(uv_seg.uvs)
 
-                
-                #vertex_buffer.extend(vert_seg)
-                #triangle_buffer.extend(tri_seg)
-                vertex_buffer.extend(convert_vert)
-                triangle_buffer.extend(convert_tri)
+            
+            #vertex_buffer.extend(vert_seg)
+            #triangle_buffer.extend(tri_seg)
+            vertex_buffer.extend(convert_vert)
+            triangle_buffer.extend(convert_tri)
 
-                vert_offsets.append(len(vertex_buffer))
-                tri_offsets.append(len(triangle_buffer))
-                #uv_tri_buffer.extend(tri_seg)
+            vert_offsets.append(len(vertex_buffer))
+            tri_offsets.append(len(triangle_buffer))
+            #uv_tri_buffer.extend(tri_seg)
 
         new_mesh.from_pydata(vertex_buffer, [], triangle_buffer)
 
@@ -698,9 +714,8 @@ def set_weights(obj, model_chunk, model_chunk_list):
         obj.vertex_groups.new(name=vg_name)
 
     geom = parse_zero.select_chunk_from_id('GEOM', model_chunk)
-    for child in geom.children:
-        if(child.name == 'SEGM'):
-            vertex_weights.extend(parse_zero.select_chunk_from_id('WGHT', child).weights)
+    for child in geom.select('SEGM'):
+        vertex_weights.extend(parse_zero.select_chunk_from_id('WGHT', child).weights)
 
     for i in range(len(obj.data.vertices)):
         #if(vertex_weights[4*i+0][0] != 0):
@@ -783,7 +798,7 @@ def create_armature_from_model_list(model_list):
 
     # exit???
 
-def load_animation(file_root):
+def load_animation(file_root, remember_names=False):
 
     scene_info = parse_zero.select_chunk_from_id('SINF', file_root)
     frame_info = parse_zero.select_chunk_from_id('FRAM', file_root)
@@ -793,11 +808,10 @@ def load_animation(file_root):
 
     bpy.context.scene.render.fps = frame_info.frame_rate
     
-    crc_reference = dict()
-
-    for bobj in bpy.data.objects:
-        crc_reference.update({ msh2_crc.crc(bobj.name) : bobj.name })
-
+    # scene names first, they win over the spellings in the dictionary
+    crc_reference = msh2_crc.CRCIndex(bobj.name for bobj in bpy.data.objects)
+    if(remember_names):
+        crc_reference.merge(known_crc_names())
 
     animation_root = parse_zero.select_chunk_from_id('ANM2', file_root)
     if(animation_root):
@@ -806,8 +820,13 @@ def load_animation(file_root):
         print(len(kfr_root.keyframes), '\n')
         for obj in kfr_root.keyframes:
             print(hex(obj.crc))
-            if obj.crc in crc_reference.keys():
+            if obj.crc in crc_reference:
                 print(crc_reference[obj.crc])
+                if(crc_reference[obj.crc] not in bpy.data.objects):
+                    # known from an earlier import but not in this scene, animate an empty in its place
+                    empty = bpy.data.objects.new(name=crc_reference[obj.crc], object_data=None)
+                    empty.rotation_mode = 'QUATERNION'
+                    bpy.context.scene.collection.objects.link(empty)
 
                 bpy.data.objects[crc_reference[obj.crc]].animation_data_create()
                 action = bpy.data.objects[crc_reference[obj.crc]].animation_data.action = bpy.data.actions.new(name='{0}_Action'.format(crc_reference[obj.crc]))
@@ -880,6 +899,9 @@ class ImportZero(bpy.types.Operator, ImportHelper):
 
     clear_scene : bpy.props.BoolProperty(name='Clear Scene', default=True)
 
+    remember_names : bpy.props.BoolProperty(name='Remember Names', default=False,
+        description='Keep object names for later imports and animate empties for known bones missing from the scene')
+
     def execute(self, context):
-        load(self.filepath, self.load_objects, self.load_animations, self.clear_scene)
+        load(self.filepath, self.load_objects, self.load_animations, self.clear_scene, self.remember_names)
         return {'FINISHED'}
\ No newline at end of file
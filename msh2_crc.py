@@ -5,8 +5,16 @@
        schlechtwetterfront.github.io/ze_filetypes/msh.html
    for more information regarding the file format.
 '''
-from struct import pack
+from struct import Struct, pack, unpack
+import os
 import sys
+import json
+import tempfile
+
+try:
+    import numpy
+except ImportError: # only needed for crc_padded
+    numpy = None
 
 
 class CRCError(Exception):
@@ -138,6 +146,110 @@ def crc(string):
     return return_lowest_bits(~crc_)
 
 
+# TOLOWER as a bytes.translate table, lowercases a whole name in one call
+LOWER_BYTES = bytes(TOLOWER)
+
+
+def slicing_tables(count):
+    # table k holds the register change of a byte followed by k zero bytes
+    tables = [TABLE_32]
+    for k in range(1, count):
+        tables.append(tuple(((value << 8) & 0xFFFFFFFF) ^ TABLE_32[value >> 24] for value in tables[-1]))
+    return tuple(tables)
+
+# TABLE_32 extended for hashing 8 bytes per step
+SLICING_TABLES = slicing_tables(8)
+
+# 8 bytes as two big endian words, the CRC shifts bytes in from the top
+SLICE_WORDS = Struct('>II')
+
+
+def crc_bytes(data, state=0xFFFFFFFF, final=True):
+    '''Calculate the Zero CRC of bytes, bytearray or memoryview data, as crc
+    does for a str of the same characters.
+
+    data is lowercased in one translate call and hashed 8 bytes per step
+    with slicing tables, for long strings straight from a parsed buffer.
+    state and final continue a CRC as in crc_extend.
+    '''
+    if(not isinstance(data, bytes)):
+        data = bytes(data)
+    data = data.translate(LOWER_BYTES)
+    t0, t1, t2, t3, t4, t5, t6, t7 = SLICING_TABLES
+    end = len(data) & ~7
+    for high, low in SLICE_WORDS.iter_unpack(memoryview(data)[:end]):
+        high ^= state
+        state = (t7[high >> 24] ^ t6[(high >> 16) & 0xFF] ^ t5[(high >> 8) & 0xFF] ^ t4[high & 0xFF] ^
+            t3[low >> 24] ^ t2[(low >> 16) & 0xFF] ^ t1[(low >> 8) & 0xFF] ^ t0[low & 0xFF])
+    for byte in data[end:]:
+        state = ((state << 8) & 0xFFFFFFFF) ^ t0[(state >> 24) ^ byte]
+    return state ^ 0xFFFFFFFF if final else state
+
+
+def name_bytes(name):
+    '''str names map char by char to bytes, as ord() does in crc.'''
+    if(isinstance(name, str)):
+        return name.encode('latin-1')
+    return bytes(name or b'')
+
+
+def crc_many(names, vectorized=False):
+    '''Calculate the Zero CRCs of a sequence of str or bytes names as a list.
+
+    Every name goes through crc_bytes. vectorized hashes all names at once
+    with numpy, see crc_padded.
+    '''
+    if(vectorized):
+        return crc_padded(pad_names(names)).tolist()
+    return [crc_bytes(name_bytes(name)) for name in names]
+
+
+def crc_extend(state, name):
+    '''CRC register after hashing name from state, without the final inversion.
+
+    The CRC runs left to right, so the state of a shared prefix can be
+    reused: crc(a + b) == crc_extend(crc_extend(0xFFFFFFFF, a), b) ^ 0xFFFFFFFF.
+    '''
+    return crc_bytes(name_bytes(name), state, final=False)
+
+
+def pad_names(names):
+    '''Names as a numpy array of NUL padded fixed width bytes.'''
+    names = [name_bytes(name) for name in names]
+    return numpy.array(names, dtype='S{0}'.format(max(1, max(map(len, names), default=1))))
+
+
+def crc_padded(padded, states=None, final=True):
+    '''Calculate the Zero CRCs of a numpy array of NUL padded names.
+
+    padded is a fixed width bytes array (dtype 'S<n>') or a 2D uint8 array
+    with a name per row, names end at the first NUL. Hashes one column of
+    bytes of all names per step and returns a uint32 array.
+
+    states are the registers to start from, as returned with final=False
+    (see crc_extend). They broadcast against the rows, a column of n states
+    hashes every name after each of them into an n by rows result.
+    '''
+    if(numpy == None):
+        raise CRCError('crc_padded needs numpy')
+    padded = numpy.asarray(padded)
+    if(padded.dtype.kind == 'S'):
+        padded = padded.view(numpy.uint8).reshape(len(padded), padded.dtype.itemsize)
+    table = numpy.array(TABLE_32, dtype=numpy.uint32)
+    lowered = numpy.array(TOLOWER, dtype=numpy.uint32)[padded]
+    active = numpy.cumprod(padded != 0, axis=1, dtype=numpy.bool_)
+    crcs = numpy.full(len(padded), 0xFFFFFFFF, dtype=numpy.uint32)
+    if(states is not None):
+        crcs = numpy.asarray(states, dtype=numpy.uint32) & crcs
+    for column in range(padded.shape[1]):
+        rows = active[:, column]
+        if(not rows.any()):
+            break
+        step = (crcs << numpy.uint32(8)) ^ table[(crcs >> numpy.uint32(24)) ^ lowered[:, column]]
+        crcs = numpy.where(rows, step, crcs)
+    return crcs ^ numpy.uint32(0xFFFFFFFF) if final else crcs
+
+
 def strcrc(string):
     '''Calculate the Zero CRC and return it in a structure
     usable in .msh files.'''
@@ -145,9 +257,128 @@ def strcrc(string):
 
 
 def compare_crc_adv(possible_strings, crc_):
-    for string in possible_strings:
-        if(crc_ == strcrc(string)):
+    '''First of possible_strings whose strcrc is crc_, or None.
+
+    possible_strings may be a CRCIndex, which answers without a scan.
+    '''
+    crc_ = unpack('<I', crc_)[0]
+    if(isinstance(possible_strings, CRCIndex)):
+        return possible_strings.get(crc_)
+    possible_strings = list(possible_strings)
+    for string, string_crc in zip(possible_strings, crc_many(possible_strings)):
+        if(crc_ == string_crc):
             return string
 
+
+def fold_name(name):
+    '''name as the CRC sees it, spellings with equal folds are one name.'''
+    return name_bytes(name).translate(LOWER_BYTES)
+
+
+def default_index_path():
+    return os.path.join(os.path.expanduser('~'), '.swbf2_msh', 'crc_index.json')
+
+
+class CRCIndex():
+    '''Reverse lookup from Zero CRCs to names.
+
+    Spellings that only differ in case share a CRC and are kept as one
+    name, the first one added wins. Different names with the same CRC are
+    collisions, all of them are kept and reported by collisions(). Indices
+    are saved as JSON and can be loaded from JSON or from plain name lists
+    (one name per line), e.g. dictionaries of known bone and hardpoint names.
+    '''
+
+    def __init__(self, names=()):
+        self._names = {}
+        self.update(names)
+
+    def update(self, names):
+        '''Add str or bytes names in bulk, returns the CRCs that gained a colliding name.'''
+        names = [name.decode('latin-1') if isinstance(name, bytes) else name for name in names if name]
+        collided = []
+        for name, crc_ in zip(names, crc_many(names)):
+            self.insert(crc_, name, collided)
+        return collided
+
+    def add(self, name):
+        return self.update([name])
+
+    def insert(self, crc_, name, collided=None):
+        # trusts crc_, used by update and when merging other indices
+        known = self._names.get(crc_)
+        if(known == None):
+            self._names[crc_] = [name]
+        elif(all(fold_name(name) != fold_name(other) for other in known)):
+            known.append(name)
+            if(collided != None):
+                collided.append(crc_)
+
+    def merge(self, other):
+        '''Add the names of another CRCIndex, a {crc: name} dict or a sequence of names.'''
+        collided = []
+        if(isinstance(other, CRCIndex)):
+            for crc_, names in other._names.items():
+                for name in names:
+                    self.insert(crc_, name, collided)
+        elif(isinstance(other, dict)):
+            for crc_, name in other.items():
+                self.insert(int(crc_), name, collided)
+        else:
+            collided = self.update(other)
+        return collided
+
+    def merge_file(self, path):
+        return self.merge(CRCIndex.load(path))
+
+    def get(self, crc_, default=None):
+        known = self._names.get(crc_)
+        return known[0] if known else default
+
+    def names(self, crc_):
+        return list(self._names.get(crc_, ()))
+
+    def collisions(self):
+        return {crc_:list(names) for crc_, names in self._names.items() if len(names) > 1}
+
+    def __getitem__(self, crc_):
+        return self._names[crc_][0]
+
+    def __contains__(self, crc_):
+        return crc_ in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {'version':1, 'names':{'{0:08x}'.format(crc_):names for crc_, names in sorted(self._names.items())}}
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as index_file:
+                json.dump(data, index_file, indent=0)
+            os.replace(temp_path, path)
+        except Exception:
+            if(os.path.exists(temp_path)):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, encoding='latin-1') as index_file:
+            text = index_file.read()
+        if(text.lstrip().startswith('{')):
+            for crc_, names in json.loads(text)['names'].items():
+                for name in names:
+                    index.insert(int(crc_, 16), name)
+        else:
+            index.update(line.strip() for line in text.splitlines())
+        return index
+
 if __name__ == '__main__':
     print(crc(sys.argv[1]))
\ No newline at end of file
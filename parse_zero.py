@@ -1,217 +1,315 @@
 import sys
 import io
+import os
+import re
+import mmap
+import glob
 import struct
+import operator
+import functools
+import itertools
+import threading
+import concurrent.futures
+import numpy
+
+try:
+    from . import msh2_crc
+except ImportError: # outside of blender, as a top level module
+    import msh2_crc
+
+# chunks holding nothing but nested chunks, MATL counts its MATD chunks first
+SUBCHUNKS = 'subchunks'
+INDEXED_SUBCHUNKS = 'indexed subchunks'
+
+# payload layout of every chunk id, as (field, format) in file order, compiled
+# into the readers and writers of zero_id_dict by compile_schema
+#   'I', 'f', '3f'  fixed fields, one value or a tuple of values
+#   '*3f'           a u32 count, then count records, lists of tuples (or of
+#                   values for single value records), numpy arrays with arrays set
+#   'str'           a NUL padded string, the rest of the chunk
+#   'weights', ...  fields with their own reader and writer, see FIELD_CODECS
+zero_schema = {
+    'HEDR':SUBCHUNKS,
+    'MSH2':SUBCHUNKS,
+    'SINF':SUBCHUNKS,
+    'NAME':(('data', 'str'),),
+    'FRAM':(('start_frame', 'I'), ('end_frame', 'I'), ('frame_rate', 'f')),
+    'BBOX':(('rotation', '4f'), ('center', '3f'), ('extents', '3f'), ('radius', 'f')),
+
+    'MATL':INDEXED_SUBCHUNKS,
+    'MATD':SUBCHUNKS,
+    'DATA':(('diffuse', '4f'), ('ambient', '4f'), ('specular_color', '4f'), ('specular_strength', 'f')),
+    'ATRB':(('flags', 'B'), ('render_type', 'B'), ('data0', 'B'), ('data1', 'B')),
+    'TX0D':(('data', 'str'),),
+    'TX1D':(('data', 'str'),),
+    'TX2D':(('data', 'str'),),
+    'TX3D':(('data', 'str'),),
+
+    'MODL':SUBCHUNKS,
+    'MTYP':(('model_type', 'I'),),
+    'MNDX':(('model_index', 'I'),),
+    'FLGS':(('flags', 'I'),),
+    'TRAN':(('scale', '3f'), ('quaternion', '4f'), ('location', '3f')),
+    'SWCI':(('coll_type', 'I'), ('x', 'f'), ('y', 'f'), ('z', 'f')),
+    'PRNT':(('data', 'str'),),
+
+    'GEOM':SUBCHUNKS,
+    'SEGM':SUBCHUNKS,
+    'MATI':(('material_index', 'I'),),
+    'POSL':(('verts', '*3f'),),
+    'WGHT':(('weights', 'weights'),),
+    'NRML':(('normals', '*3f'),),
+    'UV0L':(('uvs', '*2f'),),
+    'NDXL':(),
+    'NDXT':(('tris', '*3H'),),
+    'STRP':(('strips', '*H'),),
+    'ENVL':(('envelopes', '*I'),),
+    'SHDW':(('verts', '*3f'), ('edges', '*4H')),
+
+    'CLTH':SUBCHUNKS,
+    'CTEX':(('data', 'str'),),
+    'CPOS':(('cloth_verts', '*3f'),),
+    'CUV0':(('cloth_uvs', '*2f'),),
+    'FIDX':(('fixed_points', '*I'),),
+    'FWGT':(('weights', 'names'),),
+    'CMSH':(('cloth_tris', '*3I'),),
+    'SPRS':(('stretch_constraints', '*2H'),),
+    'CPRS':(('cross_constraints', '*2H'),),
+    'BPRS':(('bend_constraints', '*2H'),),
+    'COLL':(('collisions', 'collisions'),),
+
+    'SKL2':(('bones', 'bones'),),
+    'BLN2':(('values', 'blend_factors'),),
+    'ANM2':SUBCHUNKS,
+    'CYCL':(('animations', 'cycles'),),
+    'KFR3':(('keyframes', 'keyframes'),),
+
+    'CL1L':(),
+}
 
-from . import msh2_crc
-
-zero_id_dict = {
-    'HEDR':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'MSH2':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'SINF':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-
-    'NAME':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    {'data':'{0}s{1}x'}),
-    'FRAM':(lambda file, chunk: update_chunk_dict(chunk, start_frame = u32(file),
-    end_frame = u32(file), frame_rate = sf32(file)),
-    {'start':'I','end':'I','rate':'f'}),
-
-    'BBOX':(lambda file, chunk: skip_chunk(file, chunk),
-    None),
-
-    'MATL':(lambda file, chunk: read_indexed_subchunks(file, chunk, u32(file)),
-    {'data':'I'}),
-
-    'MATD':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-
-    'DATA':(lambda file, chunk: update_chunk_dict(chunk, diffuse=data_seq(file, 4, 'f', 0, chunk),
-    ambient=data_seq(file, 4, 'f', 0, chunk), specular_color=data_seq(file, 4, 'f', 0, chunk), specular_strength=sf32(file)) if \
-        chunk.parent.name == 'MATD' else skip_chunk(file,chunk),
-        {'diffuse':'4f', 'ambient':'4f', 'specular':'4f', 'specular_strength':'f'}),
-
-    'ATRB':(lambda file, chunk: update_chunk_dict(chunk, flags=u8(file), render_type=u8(file), data0=u8(file), data1=u8(file)),
-    {'flags':'B', 'render_type':'B', 'data0':'B', 'data1':'B'}),
-    
-    'TX0D':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    {'data':'{0}s{1}x'}),
-    'TX1D':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    None),
-    'TX2D':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    None),
-    'TX3D':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    None),
-
-    'MODL':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'MTYP':(lambda file, chunk: update_chunk_dict(chunk, model_type=u32(file)),
-    {'data':'I'}),
-    'MNDX':(lambda file, chunk: update_chunk_dict(chunk, model_index=u32(file)),
-    {'data':'I'}),
-    'FLGS':(lambda file, chunk: update_chunk_dict(chunk, flags=u32(file)),
-    {'data':'I'}),
-
-    'TRAN':(lambda file, chunk: update_chunk_dict(chunk, scale=data_seq(file, 3, 'f', 0, chunk),
-     quaternion=data_seq(file, 4, 'f', 0, chunk), location=data_seq(file, 3, 'f', 0, chunk)),
-     {'scale':'3f', 'rotation':'4f', 'location':'3f'}),
-
-    'SWCI':(lambda file, chunk: update_chunk_dict(chunk, coll_type=u32(file), x=sf32(file),y=sf32(file),z=sf32(file)),
-    {'type':'I', 'x':'f', 'y':'f', 'z':'f'}),
-
-    'PRNT':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    {'data':'{0}s{1}x'}),
-    'GEOM':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'BBOX':(lambda file, chunk: skip_chunk(file, chunk),
-    {'rotation':'4f', 'center':'3f', 'extents':'3f', 'radius':'f'}),
-    'SEGM':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'MATI':(lambda file, chunk: update_chunk_dict(chunk, material_index=u32(file)),
-    {'data':'I'}),
-    
-    'POSL':(lambda file, chunk: update_chunk_dict(chunk, verts=data_seq(
-        file, 3, 'f', u32(file), chunk)),
-        {'count':'I', 'data':'3f'}),
-
-
-    'WGHT':(lambda file, chunk: update_chunk_dict(chunk,
-        weights=read_weights(file)),
-        {'count':'I','data':'If'}),
+# ids that mean something else outside this parent, skipped there
+SCHEMA_PARENTS = {'DATA':'MATD'}
+
+# written but skipped on read, import_zero rebuilds normals and strips itself
+UNREAD_IDS = {'NRML', 'STRP'}
+
+def decodes_payload(chunk):
+    # chunks the readers skip keep their bytes instead, see read_chunk
+    fields = zero_schema.get(chunk.name)
+    if(not fields or chunk.name in UNREAD_IDS):
+        return False
+    if(chunk.name in SCHEMA_PARENTS):
+        return chunk.parent != None and chunk.parent.name == SCHEMA_PARENTS[chunk.name]
+    return True
+
+@functools.lru_cache(maxsize=None)
+def struct_codec(fmt):
+    # little endian struct.Struct for a zero_schema style format, compiled once
+    return struct.Struct('<{0}'.format(fmt))
+
+CHUNK_HEADER = struct_codec('4sI')
+U8 = struct_codec('B')
+U16 = struct_codec('H')
+U32 = struct_codec('I')
+F32 = struct_codec('f')
+CYCL_RECORD = struct_codec('64sfIII')
+TRANSLATION_FRAME = struct_codec('I3f')
+ROTATION_FRAME = struct_codec('I4f')
+KEYFRAME_HEADER = struct_codec('4I')
+COLLISION_RECORD = struct_codec('I3f')
+WEIGHT_RECORD = struct_codec('If')
+BONE_RECORD = struct_codec('2I3f')
+BLEND_RECORD = struct_codec('If')
+
+# chunks whose handlers only read nested chunks, walked even when parsing lazily
+SUBCHUNK_IDS = {id for id, fields in zero_schema.items() if fields in (SUBCHUNKS, INDEXED_SUBCHUNKS)}
+
+# ids the readers know, what a resync scan looks for in damaged chunks
+KNOWN_IDS = set(zero_schema)
+KNOWN_ID_PATTERN = re.compile(b'|'.join(re.escape(id.encode()) for id in sorted(KNOWN_IDS)))
+
+# taken by lazy chunks decoding on first access, a second thread touching the chunk waits for the first
+LAZY_LOCK = threading.RLock()
+
+# chunk nesting allowed by default, files written by the exporters nest 6 chunks deep
+MAX_DEPTH = 64
+
+# rough memory taken by a decoded record in list mode, a tuple and its values
+LIST_RECORD_BYTES = 64
+LIST_VALUE_BYTES = 32
+
+# dtypes used by the array mode of data_records and read_weights
+ARRAY_DTYPES = {'f':numpy.dtype('<f4'), 'H':numpy.dtype('<u2'), 'I':numpy.dtype('<u4')}
+WEIGHT_DTYPE = numpy.dtype([('index', '<u4'), ('weight', '<f4')])
+BONE_DTYPE = numpy.dtype([('crc', '<u4'), ('bone_type', '<u4'), ('constrain', '<f4'),
+    ('length1', '<f4'), ('length2', '<f4')])
+BLEND_DTYPE = numpy.dtype([('crc', '<u4'), ('value', '<f4')])
+TRANSLATION_FRAME_DTYPE = numpy.dtype([('index', '<u4'), ('data', '<f4', (3,))])
+ROTATION_FRAME_DTYPE = numpy.dtype([('index', '<u4'), ('data', '<f4', (4,))])
+
+class zeroFormatError(ValueError):
+    '''A chunk or count that does not fit the bytes it claims, or a file
+    that would decode past the memory limit.'''
+
+class zeroShortPayload(Exception):
+    # recovering, a chunk too short for its fields, see zeroBuffer.need and read_payload
+    pass
+
+class zeroLimits():
+    '''Bounds for decoding untrusted files.
+
+    Fixed fields and counts are always checked against the bytes left in
+    their chunk and chunk sizes against their parent before anything is
+    read or allocated. max_bytes caps the memory the decoded records of
+    one buffer may take (estimated, see LIST_RECORD_BYTES), None for no
+    cap. With recover set, a count that does not fit is cut to what does,
+    a chunk too short for its fields is left undecoded and a damaged chunk
+    header is skipped by scanning for the next known chunk id, all
+    reported to the instrument, instead of raising zeroFormatError.
+    Chunks nested more than max_depth levels deep raise zeroFormatError,
+    with recover set too.
+    '''
+
+    def __init__(self, max_bytes=None, recover=False, max_depth=MAX_DEPTH):
+        self.max_bytes = max_bytes
+        self.recover = recover
+        self.max_depth = max_depth
+
+DEFAULT_LIMITS = zeroLimits()
+
+def sound_id(name):
+    # a chunk id the readers take for one, 4 bytes of A-Z and 0-9
+    return name.isalnum() and name.upper() == name
 
-    'NRML':(lambda file, chunk: skip_chunk(file, chunk),
-    {'count':'I','data':'3f'}),
-    
-    'UV0L':(lambda file, chunk: update_chunk_dict(chunk, uvs=data_seq(
-    file, 2, 'f', u32(file), chunk)),
-    {'count':'I', 'data':'2f'}),
-
-    'NDXL':(lambda file, chunk: skip_chunk(file, chunk),
-    None),
-    'NDXT':(lambda file, chunk: update_chunk_dict(chunk, tris=data_seq(
-    file, 3, 'H', u32(file), chunk)),
-    {'count':'I', 'data':'3H'}),
-
-    'STRP':(lambda file, chunk: skip_chunk(file, chunk),
-    {'count':'I','data':None}),
-    'ENVL':(lambda file, chunk: update_chunk_dict(chunk, envelopes=data_seq(
-    file, 1, 'I', u32(file), chunk)),
-    {'count':'I', 'data':'I'}),
-
-    'SHDW':(lambda file, chunk: read_shadow_mesh(file, chunk),
-    {'num_verts':'I', 'verts':'3f', 'num_edges':'I', 'edges':'4H'}),
-
-    'CLTH':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'CTEX':(lambda file, chunk: update_chunk_dict(chunk, data=zero_string(file, chunk)),
-    {'data':'{}s{}x'}),
-    'CPOS':(lambda file, chunk: update_chunk_dict(chunk, cloth_verts=data_seq(file, 3, 'f', u32(file), chunk)),
-    {'count':'I', 'data':'3f'}),
-    'CUV0':(lambda file, chunk: update_chunk_dict(chunk, cloth_uvs=data_seq(file, 2, 'f', u32(file), chunk)),
-    {'count':'I', 'data':'2f'}),
-    'FIDX':(lambda file, chunk: update_chunk_dict(chunk, fixed_points=data_seq(file, 1, 'I', u32(file), chunk)),
-    {'count':'I', 'data':'I'}),
-    'FWGT':(lambda file, chunk: read_cloth_weights(file, chunk),
-    {'data':None}), #bytes object
-    'CMSH':(lambda file, chunk: update_chunk_dict(chunk, cloth_tris=data_seq(file, 3, 'I', u32(file), chunk)),
-    {'count':'I', 'data':'3I'}),
-    'SPRS':(lambda file, chunk: update_chunk_dict(chunk, stretch_constraints=data_seq(file, 2, 'H', u32(file), chunk)),
-    {'count':'I', 'data':'2H'}),
-    'CPRS':(lambda file, chunk: update_chunk_dict(chunk, cross_constraints=data_seq(file, 2, 'H', u32(file), chunk)),
-    {'count':'I', 'data':'2H'}),
-    'BPRS':(lambda file, chunk: update_chunk_dict(chunk, bend_constraints=data_seq(file, 2, 'H', u32(file), chunk)),
-    {'count':'I', 'data':'2H'}),
-    'COLL':(lambda file, chunk: read_cloth_collisions(file, chunk),
-    {'data':None}), #data is a bytes object it is written directly to the file.
-    'SKL2':(lambda file, chunk: read_zero_skeleton(file, chunk),
-    {'count':'I', 'data':'2I3f'}),
-    'BLN2':(lambda file, chunk: read_zero_blend_factors(file, chunk),
-    {'count':'I', 'data':'If'}),
-    'ANM2':(lambda file, chunk: read_subchunks(file, chunk),
-    None),
-    'CYCL':(lambda file, chunk: update_chunk_dict(chunk,
-     animations = read_animation_cycle_data(file)),
-     {'count':'I', 'ani_name':'13s51x', 'frame_rate':'f', 'play_style':'I', 'first_frame':'I', 'last_frame':'I'}),
-
-    'KFR3':(lambda file, chunk: update_chunk_dict(chunk, 
-    keyframes = read_keyframes_per_bone(file, chunk)),
-    {'count':'I', 'data':None}),
-
-    'CL1L':(lambda file, chunk: skip_chunk(file, chunk),
-    None),
-}
 def u8(file):
-    return struct.unpack('<B', file.read(1))[0]
+    return file.unpack(U8)[0]
 
 def u16(file):
-    return struct.unpack('<H', file.read(2))[0]
+    return file.unpack(U16)[0]
 
 def u32(file):
-    return struct.unpack('<I', file.read(4))[0]
-
-def zero_string(file, chunk, ascii=False):
-    if(ascii):
-        if 'bytes_read' not in chunk.__dict__.keys():
-            chunk.bytes_read = 0
-        temp = b''
-        c = b''
-        while(True):
-            c = file.read(1)
-            chunk.bytes_read += 1
-            if(c == b'\x00'):
-                break
-            temp += c
-        return temp.decode('utf-8')
-
-    else:
-        size = chunk.size_in_bytes
-        data = struct.unpack('{0}s'.format(size), file.read(size))[0]
-        return data.decode('utf-8').rstrip('\x00')
+    return file.unpack(U32)[0]
+
+def u32_count(file, chunk):
+    # the u32 count leading the records of chunk, checked against what is left of it
+    file.need(chunk, U32.size, 'count')
+    return u32(file)
+
+def decode_text(file, chunk, data):
+    '''data as utf-8 text. Invalid bytes raise zeroFormatError or, recovering,
+    are replaced by U+FFFD and reported to the instrument.'''
+    try:
+        return str(data, 'utf-8')
+    except UnicodeDecodeError as error:
+        message = 'invalid utf-8 at byte {0} of a string'.format(error.start)
+        if(not file.limits.recover):
+            raise zeroFormatError('{0} at {1}: {2}'.format(chunk.name, chunk.offset, message))
+        if(file.instrument != None):
+            file.instrument.notice(chunk, message)
+        return str(data, 'utf-8', 'replace')
+
+def zero_string(file, chunk):
+    size = chunk.size_in_bytes
+    data = struct.unpack('{0}s'.format(size), file.read(size))[0]
+    return decode_text(file, chunk, data).rstrip('\x00')
+
+def chunk_remainder(file, chunk):
+    # the rest of the chunk payload as bytes, the file is left at the chunk end
+    return bytes(file.read(chunk.offset + chunk.size_in_bytes - file.tell()))
+
+def string_table(data, count, strings=1, record=None, decode=None):
+    '''Decode count entries of NUL terminated strings from the bytes data.
+
+    An entry is strings strings, followed by a record of the struct record
+    if given, and is returned as a tuple of the strings and the record's
+    fields. Plain tables (one string, no record) are split in one go and
+    return just the strings. Every distinct string is decoded once, by
+    decode(raw) if given or as strict utf-8, and interned. Returns the
+    entries and the bytes they take, the table ends early at the end of
+    data.
+    '''
+    decode = decode or (lambda raw: str(raw, 'utf-8'))
+    names = {}
+    def name(raw):
+        text = names.get(raw)
+        if(text == None):
+            text = names[raw] = sys.intern(decode(raw))
+        return text
+
+    if(strings == 1 and record == None):
+        # the last part is the rest after count strings, or one without its NUL
+        parts = data.split(b'\x00', count)
+        parts.pop()
+        return [name(raw) for raw in parts], sum(map(len, parts)) + len(parts)
+
+    entries = []
+    offset = 0
+    for i in range(count):
+        entry = []
+        for j in range(strings):
+            end = data.find(b'\x00', offset)
+            if(end < 0):
+                return entries, offset
+            entry.append(name(data[offset:end]))
+            offset = end + 1
+        if(record != None):
+            if(offset + record.size > len(data)):
+                return entries, offset
+            entry.extend(record.unpack_from(data, offset))
+            offset += record.size
+        entries.append(tuple(entry))
+    return entries, offset
 
 def sf32(file):
-    return struct.unpack('<f', file.read(4))[0]
+    return file.unpack(F32)[0]
 
 def skip_chunk(file, chunk):
     file.seek(chunk.size_in_bytes, io.SEEK_CUR)
 
-def data_seq(file, int_count_per_unit, string_format, int_count_of_indices, chunk):
-    temp_seq = None
-    bytes_read = 4
-    if(int_count_of_indices > 0):
-        temp_seq = []
-        if(int_count_per_unit > 1):
-            for i in range(int_count_of_indices):
-                bytes_to_read = struct.calcsize('<{0}{1}'.format(int_count_per_unit, string_format))
-                temp_seq.append(struct.unpack('<{0}{1}'.format(int_count_per_unit, string_format),
-                file.read(bytes_to_read)))
-                bytes_read += bytes_to_read
-        else:
-            for i in range(int_count_of_indices):
-                bytes_to_read = struct.calcsize('<{0}{1}'.format(int_count_per_unit, string_format))
-                temp_seq.append(struct.unpack('<{0}{1}'.format(int_count_per_unit, string_format),
-                file.read(bytes_to_read))[0])
-                bytes_read += bytes_to_read
+def skip_chunk_remainder(file, chunk, bytes_read):
+    # bytes left in chunk after its fields, up to 4 padding it to 4 bytes are not noticed (see write_padded)
+    left = chunk.size_in_bytes-bytes_read
+    if(left > 0):
+        file.seek(left, io.SEEK_CUR)
+        if(file.instrument != None and (left > 4 or chunk.size_in_bytes % 4 != 0)):
+            file.instrument.notice(chunk, 'chunk size {0} but {1} bytes read'.format(chunk.size_in_bytes, bytes_read))
+
+def data_records(file, chunk, count, unit, int_count_per_unit, string_format):
+    # count records of unit, lists of tuples (or values) or an array with arrays set
+    count = file.claim(chunk, count, unit.size, int_count_per_unit)
+    if(file.arrays):
+        data = file.array(ARRAY_DTYPES[string_format], int_count_per_unit*count)
+        return data.reshape(count, int_count_per_unit) if int_count_per_unit > 1 else data
+    if(int_count_per_unit > 1):
+        return list(file.iter_unpack(unit, count))
+    return [value for (value,) in file.iter_unpack(unit, count)]
+
+def write_records(file, value, unit, int_count_per_unit, string_format):
+    # u32 count, then the records of a list, a numpy array or bytes packed up front
+    if(isinstance(value, (bytes, bytearray, memoryview))):
+        count = len(value)//unit.size
+        data = value
+    elif(isinstance(value, numpy.ndarray)):
+        count = value.size//int_count_per_unit
+        data = numpy.ascontiguousarray(value, ARRAY_DTYPES[string_format]).tobytes()
     else:
-        bytes_to_read = struct.calcsize('<{0}{1}'.format(int_count_per_unit, string_format))
-        temp_seq = struct.unpack('<{0}{1}'.format(int_count_per_unit, string_format),
-        file.read(bytes_to_read))
-        bytes_read += bytes_to_read
-    
-    if(int_count_of_indices > 0):
-        if(bytes_read < chunk.size_in_bytes):
-            file.seek(chunk.size_in_bytes-bytes_read, io.SEEK_CUR)
-            print('debug:chunksize: ', chunk.size_in_bytes, bytes_read)
-            print(chunk.name, hex(file.tell()))
-
-    return temp_seq
-
-def read_weights(file):
-    count = u32(file)
-    data = []
-    for i in range(count*4):
-        data.append((u32(file),sf32(file)))
-    return data
+        count = len(value)
+        values = itertools.chain.from_iterable(value) if int_count_per_unit > 1 else value
+        data = struct.pack('<{0}{1}'.format(count*int_count_per_unit, string_format), *values)
+    file.write(U32.pack(count))
+    file.write(data)
+
+def read_weights(file, chunk):
+    # four weights per vertex
+    count = file.claim(chunk, u32_count(file, chunk)*4, WEIGHT_RECORD.size, 2)//4
+    if(file.arrays):
+        return file.array(WEIGHT_DTYPE, count*4)
+    return list(file.iter_unpack(WEIGHT_RECORD, count*4))
+
+def write_weights(file, weights):
+    # four (index, weight) pairs per vertex, a list of tuples or a WEIGHT_DTYPE array
+    file.write(U32.pack(len(weights)//4))
+    file.write(numpy.ascontiguousarray(weights, WEIGHT_DTYPE).tobytes())
 
 def update_chunk_dict(chunk, **d):
     chunk.__dict__.update(d)
@@ -219,72 +317,198 @@ def update_chunk_dict(chunk, **d):
         
 
 def read_chunk(file, parent=None):
-    chunk = zeroChunk(struct.unpack('<4s', file.read(4))[0].decode('utf-8'),
-                    struct.unpack('<I', file.read(4))[0], parent)
-    print(chunk)
-    if(chunk.name in zero_id_dict.keys()):
+    name, size = file.unpack(CHUNK_HEADER)
+    chunk = zeroChunk(name.decode('utf-8'), size, parent, file.tell())
+    if(not file.selects(chunk)):
+        skip_chunk(file, chunk)
+        return filtered_chunk(file, chunk)
+    if(file.instrument == None):
+        result = decode_chunk(file, chunk, parent)
+    else:
+        file.instrument.start_chunk(chunk)
+        result = decode_chunk(file, chunk, parent)
+        file.instrument.end_chunk(chunk)
+    # whatever the handler read, the next chunk starts after this one
+    file.seek(chunk.offset + chunk.size_in_bytes)
+    if(file.raw and result != None):
+        result._raw = file.read_raw(result)
+    elif(result != None and not decodes_payload(result)):
+        keep_payload(file, result)
+    return result
+
+def filtered_chunk(file, chunk):
+    # chunks left out by include and exclude, with raw set they stay as their bytes alone
+    # so an edited tree still writes back whole
+    if(not file.raw):
+        return None
+    chunk.children = None
+    chunk._raw = file.read_raw(chunk)
+    return chunk
+
+def keep_payload(file, chunk):
+    # skipped payloads are copied out so the tree still writes back whole,
+    # a payload cut short by the end of the file is dropped
+    data = file.read_raw(chunk)
+    if(len(data) == CHUNK_HEADER.size + chunk.size_in_bytes):
+        chunk._raw = bytes(data)
+
+def read_payload(file, chunk):
+    '''Decode chunk with the reader of its id, False if, recovering, the
+    chunk was too short for its fields. Such a chunk is left without
+    fields and keeps its bytes like a skipped one.'''
+    try:
         zero_id_dict[chunk.name][0](file, chunk)
+    except zeroShortPayload:
+        chunk.__dict__.clear()
+        keep_payload(file, chunk)
+        return False
+    return True
+
+def decode_chunk(file, chunk, parent):
+    if(chunk.name in zero_id_dict.keys()):
+        if(file.lazy and chunk.name not in SUBCHUNK_IDS):
+            chunk.defer(file)
+            skip_chunk(file, chunk)
+        else:
+            read_payload(file, chunk)
+            if(parent != None and chunk.children == None and chunk.name in SUBCHUNK_IDS and not file.includes(chunk)):
+                return filtered_chunk(file, chunk) # only walked looking for included chunks
     else:
-        print('found new chunk: {0}, Offset: {1}\n\n'.format(chunk.name, hex(file.tell())))
+        if(file.instrument != None):
+            file.instrument.notice(chunk, 'found new chunk')
         skip_chunk(file, chunk)
     return chunk
 
 def read_subchunks(file, parent):
-    bytes_read = 0
-    while(bytes_read < parent.size_in_bytes):
+    # a recovered root may claim more bytes than the file has
+    end = min(file.tell() + parent.size_in_bytes, len(file._view))
+    file.descend(parent)
+    while(file.tell() < end):
+        if(not file.sound_header(end)):
+            file.bad_header(parent, end)
+            continue
         chunk = read_chunk(file, parent)
-        parent.addChild(chunk)
-        bytes_read += chunk.size_in_bytes+8
+        if(chunk != None):
+            parent.addChild(chunk)
+    file.depth -= 1
 
 def read_indexed_subchunks(file, chunk, count):
-    for i in range(count):
-        chunk.addChild(read_chunk(file, chunk))
+    end = min(chunk.offset + chunk.size_in_bytes, len(file._view))
+    file.descend(chunk)
+    for i in range(file.claim(chunk, count, CHUNK_HEADER.size)):
+        while(file.tell() < end and not file.sound_header(end)):
+            file.bad_header(chunk, end)
+        if(file.tell() >= end):
+            break
+        child = read_chunk(file, chunk)
+        if(child != None):
+            chunk.addChild(child)
+    file.depth -= 1
+
+def compile_chunk_patterns(patterns):
+    # 'MODL/NAME' -> ('MODL', 'NAME')
+    if(patterns == None):
+        return None
+    return [tuple(pattern.strip('/').split('/')) for pattern in patterns]
+
+def chunk_matches(chunk, patterns):
+    # true if the ids of chunk and its parents end with one of the patterns
+    for steps in patterns:
+        node = chunk
+        for id in reversed(steps):
+            if(node == None or node.name != id):
+                break
+            node = node.parent
+        else:
+            return True
+    return False
+
+def walk_chunks(file, end, depth=0, parent=None):
+    # event generator behind parse_stream, parents are kept only as a stack
+    while(file.tell() < end):
+        if(not file.sound_header(end)):
+            file.bad_header(parent, end)
+            continue
+        name, size = file.unpack(CHUNK_HEADER)
+        chunk = zeroChunk(name.decode('utf-8'), size, parent, file.tell())
+        chunk_end = chunk.offset + chunk.size_in_bytes
+        if(not file.selects(chunk)):
+            pass
+        elif(chunk.name in SUBCHUNK_IDS):
+            payload = None
+            if(chunk.name == 'MATL'):
+                try:
+                    payload = {'count':u32_count(file, chunk)}
+                except zeroShortPayload:
+                    yield ('chunk', chunk.name, depth, chunk.offset, None)
+                    file.seek(chunk_end)
+                    continue
+            yield ('start', chunk.name, depth, chunk.offset, payload)
+            file.descend(chunk)
+            yield from walk_chunks(file, chunk_end, depth+1, chunk)
+            file.depth -= 1
+            yield ('end', chunk.name, depth, chunk.offset, None)
+        elif(chunk.name in zero_id_dict.keys()):
+            if(file.instrument != None):
+                file.instrument.start_chunk(chunk)
+            decoded = read_payload(file, chunk)
+            if(file.instrument != None):
+                file.instrument.end_chunk(chunk)
+            yield ('chunk', chunk.name, depth, chunk.offset, chunk.fields() if decoded else None)
+        else:
+            if(file.instrument != None):
+                file.instrument.notice(chunk, 'found new chunk')
+            yield ('chunk', chunk.name, depth, chunk.offset, None)
+        file.seek(chunk_end)
 
 def select_chunk_from_id(id, chunk, rec = 0):
-    
-    selection = chunk
-    #print(selection)
-    if(selection.name == id):
-        return selection #keep current
-    else:
-        if(selection.children):
-            for child in selection.children:
-                selection = select_chunk_from_id(id, child)
-                if(selection != None):    
-                    if(selection.name == id):
-                        break
-        else:
-            return None
-    return selection
+    # first match in depth first order, chunk itself included
+    return chunk.find(id)
 
-def read_animation_cycle_data(file):
-    animation_count = u32(file)
+def read_animation_cycle_data(file, chunk):
+    animation_count = file.claim(chunk, u32_count(file, chunk), CYCL_RECORD.size, 5)
     animation_list = []
-    for i in range(animation_count):
+    for name, frame_rate, play_style, start_frame, end_frame in file.iter_unpack(CYCL_RECORD, animation_count):
         anim = zeroAnimationData(
-            struct.unpack('<64s', file.read(64))[0].decode('utf-8').rstrip('\x00'),
-            sf32(file),
-            u32(file),
-            u32(file),
-            u32(file))
+            decode_text(file, chunk, name).rstrip('\x00'),
+            frame_rate,
+            play_style,
+            start_frame,
+            end_frame)
         
         animation_list.append(anim)
 
     return animation_list
 
+def write_animation_cycle_data(file, animations):
+    file.write(U32.pack(len(animations)))
+    for anim in animations:
+        file.write(CYCL_RECORD.pack(anim.animation_name.encode(), anim.frame_rate, anim.play_style,
+            anim.start_frame, anim.end_frame))
+
 def read_keyframes_per_bone(file, chunk):
-    num_of_bones = u32(file)
+    num_of_bones = file.claim(chunk, u32_count(file, chunk), KEYFRAME_HEADER.size, 4)
     bone_keyframe_list = []
     for i in range(num_of_bones):
-        keyframe_data = zeroKeyFrameData(
-            u32(file), u32(file), u32(file), u32(file), None, None)
-
-        translations = []
-        rotations = []
-        for j in range(keyframe_data.num_translation_frames):
-            translations.append(zeroFrame(u32(file), data_seq(file, 3, 'f', 0, chunk)))
-        for j in range(keyframe_data.num_rotation_frames):
-            rotations.append(zeroFrame(u32(file), data_seq(file, 4, 'f', 0, chunk)))
+        # the frames of earlier bones may have taken the bytes counted for this header
+        if(file.claim(chunk, 1, KEYFRAME_HEADER.size, 4) == 0):
+            break
+        crc, keyframe_type, num_translation_frames, num_rotation_frames = file.unpack(KEYFRAME_HEADER)
+        num_translation_frames = file.claim(chunk, num_translation_frames, TRANSLATION_FRAME.size, 4)
+        num_rotation_frames = file.claim(chunk, num_rotation_frames, ROTATION_FRAME.size, 5,
+            num_translation_frames*TRANSLATION_FRAME.size)
+        keyframe_data = zeroKeyFrameData(crc, keyframe_type, num_translation_frames, num_rotation_frames, None, None)
+
+        if(file.arrays):
+            translations = zeroFrameColumns(
+                file.array(TRANSLATION_FRAME_DTYPE, keyframe_data.num_translation_frames))
+            rotations = zeroFrameColumns(
+                file.array(ROTATION_FRAME_DTYPE, keyframe_data.num_rotation_frames))
+        else:
+            translations = [zeroFrame(frame[0], frame[1:]) for frame in
+                file.iter_unpack(TRANSLATION_FRAME, keyframe_data.num_translation_frames)]
+            rotations = [zeroFrame(frame[0], frame[1:]) for frame in
+                file.iter_unpack(ROTATION_FRAME, keyframe_data.num_rotation_frames)]
 
         keyframe_data.translationDataFrames = translations
         keyframe_data.rotationDataFrames = rotations
@@ -293,64 +517,484 @@ def read_keyframes_per_bone(file, chunk):
 
     return bone_keyframe_list
 
-def read_shadow_mesh(file, chunk):
-    num_verts = 0
-    num_edges = 0
-
-    verts_list = []
-    edges_list = []
-
-    num_verts = u32(file)
-    for i in range(num_verts):
-        verts_list.append(data_seq(file, 3, 'f', 0, chunk))
-
-    num_edges = u32(file)
-    for j in range(num_edges):
-        edges_list.append(data_seq(file, 4, 'H', 0, chunk))
-
-    chunk.verts = verts_list
-    chunk.edges = edges_list
+def write_frames(file, frames, codec, dtype):
+    # zeroFrameColumns in one go, zeroFrame lists frame by frame
+    if(isinstance(frames, zeroFrameColumns)):
+        data = numpy.empty(len(frames), dtype)
+        data['index'] = frames.indices
+        data['data'] = frames.data
+        file.write(data.tobytes())
+    else:
+        for frame in frames:
+            file.write(codec.pack(frame.index, *frame.data))
+
+def write_keyframes_per_bone(file, keyframes):
+    file.write(U32.pack(len(keyframes)))
+    for keyframe_data in keyframes:
+        translations = keyframe_data.translationDataFrames
+        rotations = keyframe_data.rotationDataFrames
+        file.write(KEYFRAME_HEADER.pack(keyframe_data.crc, keyframe_data.keyframe_type,
+            len(translations), len(rotations)))
+        write_frames(file, translations, TRANSLATION_FRAME, TRANSLATION_FRAME_DTYPE)
+        write_frames(file, rotations, ROTATION_FRAME, ROTATION_FRAME_DTYPE)
+
+def read_object_records(file, chunk, dtype, record, cls):
+    # counted records as objects of cls, or as one numpy record array with arrays set
+    if(file.arrays):
+        # one column per field, records still read as bone.crc, bone.constrain, ...
+        return file.array(dtype, file.claim(chunk, u32_count(file, chunk), dtype.itemsize)).view(numpy.recarray)
+    count = file.claim(chunk, u32_count(file, chunk), dtype.itemsize, len(dtype.names))
+    return [cls(*values) for values in file.iter_unpack(record, count)]
+
+def write_object_records(file, records, dtype):
+    # objects with an attribute per dtype field, or a record array of dtype
+    if(not isinstance(records, numpy.ndarray)):
+        fields = operator.attrgetter(*dtype.names)
+        records = [fields(record) for record in records]
+    file.write(U32.pack(len(records)))
+    file.write(numpy.ascontiguousarray(records, dtype).tobytes())
 
 def read_zero_skeleton(file, chunk):
-    chunk.bones = []
-    for i in range(u32(file)):
-        chunk.bones.append(Zero_Bone(u32(file), u32(file), sf32(file), sf32(file), sf32(file)))
+    return read_object_records(file, chunk, BONE_DTYPE, BONE_RECORD, Zero_Bone)
+
+def write_zero_skeleton(file, bones):
+    write_object_records(file, bones, BONE_DTYPE)
 
 def read_zero_blend_factors(file, chunk):
-    chunk.values = []
-    for i in range(u32(file)):
-        chunk.values.append(Zero_Blend(u32(file), sf32(file)))
+    return read_object_records(file, chunk, BLEND_DTYPE, BLEND_RECORD, Zero_Blend)
+
+def write_zero_blend_factors(file, values):
+    write_object_records(file, values, BLEND_DTYPE)
 
 def read_cloth_collisions(file, chunk):
-    chunk.collisions = []
-    chunk.bytes_read = 4
-    for i in range(u32(file)):
-        chunk.collisions.append(
-            ZeroClothCollision(zero_string(file, chunk, True),
-            zero_string(file, chunk, True), u32(file), sf32(file),
-            sf32(file), sf32(file)))
-        chunk.bytes_read += 16
-    if(chunk.bytes_read < chunk.size_in_bytes):
-        skip = chunk.size_in_bytes - chunk.bytes_read
-        file.seek(skip, io.SEEK_CUR)
+    # name, parent, then type and size of every collision object
+    count = file.claim(chunk, u32_count(file, chunk), 2 + COLLISION_RECORD.size, 6)
+    start = file.tell()
+    entries, consumed = string_table(chunk_remainder(file, chunk), count, 2, COLLISION_RECORD,
+        functools.partial(decode_text, file, chunk))
+    file.seek(start + consumed)
+    return [ZeroClothCollision(*entry) for entry in entries]
+
+def write_cloth_collisions(file, collisions):
+    data = [U32.pack(len(collisions))]
+    for coll in collisions:
+        data.append(coll.ob_name.encode() + b'\x00' + coll.ob_parent.encode() + b'\x00')
+        data.append(COLLISION_RECORD.pack(coll.col_type, coll.x, coll.y, coll.z))
+    write_padded(file, b''.join(data))
 
 def read_cloth_weights(file, chunk):
-    chunk.weights = []
-    chunk.bytes_read = 4
-    for i in range(u32(file)):
-        chunk.weights.append(zero_string(file, chunk, True))
-    if(chunk.bytes_read < chunk.size_in_bytes):
-        skip = chunk.size_in_bytes - chunk.bytes_read
-        file.seek(skip, io.SEEK_CUR)
+    # every name takes its NUL at least
+    count = file.claim(chunk, u32_count(file, chunk), 1)
+    start = file.tell()
+    weights, consumed = string_table(chunk_remainder(file, chunk), count,
+        decode=functools.partial(decode_text, file, chunk))
+    # left at the end of the table, the padding after it is no field
+    file.seek(start + consumed)
+    return weights
+
+def write_cloth_weights(file, weights):
+    write_padded(file, U32.pack(len(weights)) + b''.join(name.encode() + b'\x00' for name in weights))
+
+def write_padded(file, data):
+    # strings and string tables are padded to 4 bytes, always by at least one NUL
+    file.write(data)
+    file.write(bytes(4-len(data)%4))
+
+# fields with their own reader(file, chunk) and writer(file, value), and
+# the struct of their records if they have one
+FIELD_CODECS = {
+    'weights':(read_weights, write_weights, WEIGHT_RECORD),
+    'names':(read_cloth_weights, write_cloth_weights, None),
+    'collisions':(read_cloth_collisions, write_cloth_collisions, COLLISION_RECORD),
+    'bones':(read_zero_skeleton, write_zero_skeleton, BONE_RECORD),
+    'blend_factors':(read_zero_blend_factors, write_zero_blend_factors, BLEND_RECORD),
+    'cycles':(read_animation_cycle_data, write_animation_cycle_data, CYCL_RECORD),
+    'keyframes':(read_keyframes_per_bone, write_keyframes_per_bone, None),
+}
+
+def split_format(fmt):
+    # '3f' -> (3, 'f'), 'f' -> (1, 'f')
+    return int(fmt[:-1] or 1), fmt[-1]
+
+def schema_steps(fields):
+    '''The fields of a zero_schema entry as read/write steps, a run of fixed
+    fields is one step unpacked with one struct:
+
+        ('fixed', [(name, start, stop), ...], codec)  stop None for single values
+        ('records', name, (unit, values per record, format))
+        ('string', name, None)
+        ('field', name, (reader, writer, record))
+    '''
+    steps = []
+    run = None
+    for name, fmt in fields:
+        if(fmt in FIELD_CODECS or fmt == 'str' or fmt.startswith('*')):
+            run = None
+            if(fmt in FIELD_CODECS):
+                steps.append(('field', name, FIELD_CODECS[fmt]))
+            elif(fmt == 'str'):
+                steps.append(('string', name, None))
+            else:
+                values, string_format = split_format(fmt[1:])
+                steps.append(('records', name, (struct_codec(fmt[1:]), values, string_format)))
+            continue
+        if(run == None):
+            run = ['', [], 0]
+            steps.append(run)
+        values, string_format = split_format(fmt)
+        run[0] += fmt
+        run[1].append((name, run[2], run[2]+values if values > 1 else None))
+        run[2] += values
+    # a run is compiled into one struct once all its fields are known
+    return [('fixed', step[1], struct_codec(step[0])) if isinstance(step, list) else step for step in steps]
+
+def compile_reader(step):
+    kind, name, codec = step
+    if(kind == 'fixed'):
+        slots = name
+        if(len(slots) == 1 and slots[0][2] == None):
+            name = slots[0][0]
+            def read_value(file, chunk, fields):
+                file.need(chunk, codec.size, name)
+                fields[name] = file.unpack(codec)[0]
+            return read_value
+        fixed_names = ', '.join(slot[0] for slot in slots)
+        def read_fixed(file, chunk, fields):
+            file.need(chunk, codec.size, fixed_names)
+            values = file.unpack(codec)
+            for name, start, stop in slots:
+                fields[name] = values[start] if stop == None else values[start:stop]
+        return read_fixed
+    if(kind == 'records'):
+        unit, values, string_format = codec
+        def read_records(file, chunk, fields):
+            fields[name] = data_records(file, chunk, u32_count(file, chunk), unit, values, string_format)
+        return read_records
+    reader = zero_string if kind == 'string' else codec[0]
+    def read_field(file, chunk, fields):
+        fields[name] = reader(file, chunk)
+    return read_field
+
+def compile_writer(step):
+    # a field the chunk does not have raises, getattr decodes deferred chunks first
+    kind, name, codec = step
+    if(kind == 'fixed'):
+        slots = name
+        def write_fixed(file, chunk):
+            values = []
+            for name, start, stop in slots:
+                value = field_to_write(chunk, name)
+                if(stop == None):
+                    values.append(value)
+                else:
+                    values.extend(value)
+            file.write(codec.pack(*values))
+        return write_fixed
+    if(kind == 'records'):
+        writer = lambda file, value: write_records(file, value, *codec)
+    elif(kind == 'string'):
+        writer = lambda file, value: write_padded(file, value.encode())
+    else:
+        writer = codec[1]
+    def write_field(file, chunk):
+        writer(file, field_to_write(chunk, name))
+    return write_field
+
+def field_to_write(chunk, name):
+    # leaving a field out would write a chunk of the wrong size
+    value = getattr(chunk, name, None)
+    if(value is None):
+        raise ValueError('{0} has no {1} to write'.format(chunk.name, name))
+    return value
+
+def compile_chunk(id, fields):
+    '''(reader(file, chunk), writer(file, chunk)) of one zero_schema entry.'''
+    if(fields == SUBCHUNKS):
+        return (read_subchunks, lambda file, chunk: None)
+    if(fields == INDEXED_SUBCHUNKS):
+        return (lambda file, chunk: read_indexed_subchunks(file, chunk, u32_count(file, chunk)),
+            lambda file, chunk: file.write(U32.pack(len(chunk.children or ()))))
+
+    steps = schema_steps(fields)
+    readers = [compile_reader(step) for step in steps]
+    writers = [compile_writer(step) for step in steps]
+
+    if(id in UNREAD_IDS or not readers):
+        read = skip_chunk
+    elif(len(readers) == 1):
+        reader, = readers
+        def read(file, chunk):
+            reader(file, chunk, chunk.__dict__)
+            skip_chunk_remainder(file, chunk, file.tell() - chunk.offset)
+    else:
+        def read(file, chunk):
+            fields = chunk.__dict__
+            for reader in readers:
+                reader(file, chunk, fields)
+            skip_chunk_remainder(file, chunk, file.tell() - chunk.offset)
+
+    if(id in SCHEMA_PARENTS):
+        parent_id = SCHEMA_PARENTS[id]
+        read_in_parent = read
+        def read(file, chunk):
+            if(chunk.parent != None and chunk.parent.name == parent_id):
+                read_in_parent(file, chunk)
+            else:
+                skip_chunk(file, chunk)
+
+    def write(file, chunk):
+        for writer in writers:
+            writer(file, chunk)
+    return (read, write)
+
+def field_codec(fmt):
+    # struct of one value or record of a zero_schema format, None for strings and tables
+    if(fmt in FIELD_CODECS):
+        return FIELD_CODECS[fmt][2]
+    if(fmt == 'str'):
+        return None
+    return struct_codec(fmt.lstrip('*'))
+
+# reader and writer of every chunk id
+zero_id_dict = {id:compile_chunk(id, fields) for id, fields in zero_schema.items()}
+
+# structs of the fixed fields and the records of counted fields, by chunk id and field
+zero_codecs = {id:{name:field_codec(fmt) for name, fmt in fields if field_codec(fmt) != None}
+    for id, fields in zero_schema.items() if fields not in (SUBCHUNKS, INDEXED_SUBCHUNKS)}
+
+class zeroBuffer():
+    '''File-like reader over an in memory buffer such as an mmap.
+
+    Reads hand out slices of a memoryview and unpack straight from the
+    buffer at the current offset, so walking a file costs no syscalls.
+    With arrays set, counted vertex/index/weight payloads are decoded into
+    numpy arrays instead of lists of tuples, skeleton bones and blend
+    factors into numpy record arrays and keyframes into zeroFrameColumns. With lazy set, only the chunk
+    layout is read and payloads are decoded when first accessed.
+
+    include and exclude take chunk ids or id paths such as 'MODL/NAME'.
+    Excluded chunks are skipped along with everything below them. With
+    include given, only matching chunks and their subtrees are decoded,
+    other chunks holding nested chunks are walked to reach them and are
+    left out of the tree if nothing below them was included. With raw
+    set, chunks left out stay in the tree with no fields or children,
+    holding only their bytes.
+
+    instrument, if given, is told about every decoded chunk, see
+    profile_zero.zeroInstrument. Nothing is logged without one.
+
+    limits, a zeroLimits, bounds what a damaged or hostile file can make
+    the readers allocate. Cursors made by at() share the memory limit.
+
+    With raw set, every chunk read keeps a view of its bytes in the
+    buffer, header included, see zeroChunk.raw. Unknown and skipped chunks
+    are kept too, so a tree written back loses nothing.
+    '''
+
+    def __init__(self, buffer, offset=0, arrays=False, lazy=False, include=None, exclude=None, instrument=None,
+            limits=None, raw=False):
+        self._view = memoryview(buffer)
+        self._offset = offset
+        self.arrays = arrays
+        self.lazy = lazy
+        self.raw = raw
+        self.include = compile_chunk_patterns(include)
+        self.exclude = compile_chunk_patterns(exclude)
+        self.instrument = instrument
+        self.limits = limits or DEFAULT_LIMITS
+        self._allocated = [0]
+        self.depth = 0
+
+    def at(self, offset):
+        # independent cursor over the same buffer
+        cursor = zeroBuffer(self._view, offset, self.arrays, self.lazy, instrument=self.instrument, limits=self.limits)
+        cursor.include, cursor.exclude = self.include, self.exclude
+        cursor._allocated = self._allocated
+        return cursor
+
+    def claim(self, chunk, count, record_size, values=1, skip=0):
+        '''count checked against the bytes left in chunk (past skip more
+        bytes) for count records of record_size bytes, values values each,
+        and against the memory limit. Recovering, a count that does not fit
+        is cut to what does.'''
+        left = max(chunk.offset + chunk.size_in_bytes - self._offset - skip, 0)
+        if(count*record_size > left):
+            message = '{0} records of {1} bytes but {2} bytes left'.format(count, record_size, left)
+            if(not self.limits.recover):
+                raise zeroFormatError('{0} at {1}: {2}'.format(chunk.name, chunk.offset, message))
+            if(self.instrument != None):
+                self.instrument.notice(chunk, message)
+            count = left//record_size
+        if(self.limits.max_bytes != None):
+            self._allocated[0] += count*(record_size if self.arrays else LIST_RECORD_BYTES + values*LIST_VALUE_BYTES)
+            if(self._allocated[0] > self.limits.max_bytes):
+                raise zeroFormatError('{0} at {1}: {2} records go past the memory limit of {3} bytes'.format(
+                    chunk.name, chunk.offset, count, self.limits.max_bytes))
+        return count
+
+    def need(self, chunk, size, what):
+        '''Check that size bytes of what are left in chunk before they are
+        unpacked. Raises zeroFormatError or, recovering, reports it to the
+        instrument and raises zeroShortPayload, the chunk is left undecoded.'''
+        left = min(chunk.offset + chunk.size_in_bytes, len(self._view)) - self._offset
+        if(size > left):
+            message = '{0} bytes of {1} but {2} bytes left'.format(size, what, max(left, 0))
+            if(not self.limits.recover):
+                raise zeroFormatError('{0} at {1}: {2}'.format(chunk.name, chunk.offset, message))
+            if(self.instrument != None):
+                self.instrument.notice(chunk, message)
+            raise zeroShortPayload()
+
+    def descend(self, chunk):
+        # one more level of nested chunks below chunk, recursion stays bounded by max_depth
+        self.depth += 1
+        if(self.depth > self.limits.max_depth):
+            raise zeroFormatError('{0} at {1}: chunks nested more than {2} deep'.format(
+                chunk.name, chunk.offset, self.limits.max_depth))
+
+    def read_raw(self, chunk):
+        # zero copy view of the header and payload of chunk
+        return self._view[chunk.offset - CHUNK_HEADER.size:chunk.offset + chunk.size_in_bytes]
+
+    def sound_header(self, end):
+        # an A-Z, 0-9 chunk id at the position, with a size ending the chunk by end
+        end = min(end, len(self._view))
+        if(self._offset + CHUNK_HEADER.size > end):
+            return False
+        name, size = CHUNK_HEADER.unpack_from(self._view, self._offset)
+        return sound_id(name) and self._offset + CHUNK_HEADER.size + size <= end
+
+    def bad_header(self, parent, end):
+        '''Raise zeroFormatError for the chunk header at the position or,
+        recovering, move on to the next sound header of a known id before
+        end (or to end).'''
+        offset = self._offset
+        if(not self.limits.recover):
+            raise zeroFormatError('damaged chunk header at {0} in {1}'.format(offset, parent.name if parent else 'the file'))
+        end = min(end, len(self._view))
+        self._offset = end
+        match = KNOWN_ID_PATTERN.search(self._view, offset+1, end)
+        while(match != None):
+            if(match.start() % 4 == 0):
+                self._offset = match.start()
+                if(self.sound_header(end)):
+                    break
+                self._offset = end
+            match = KNOWN_ID_PATTERN.search(self._view, match.start()+1, end)
+        if(self.instrument != None and parent != None):
+            self.instrument.notice(parent, 'damaged chunk header at {0}, resumed at {1}'.format(offset, self._offset))
+
+    def selects(self, chunk):
+        if(self.exclude and chunk_matches(chunk, self.exclude)):
+            return False
+        return chunk.name in SUBCHUNK_IDS or self.includes(chunk)
+
+    def includes(self, chunk):
+        if(self.include == None):
+            return True
+        node = chunk
+        while(node != None):
+            if(chunk_matches(node, self.include)):
+                return True
+            node = node.parent
+        return False
+
+    def read(self, size=-1):
+        start = self._offset
+        if(size < 0):
+            self._offset = len(self._view)
+        else:
+            self._offset = min(start + size, len(self._view))
+        return self._view[start:self._offset]
+
+    def unpack(self, fmt):
+        data = fmt.unpack_from(self._view, self._offset)
+        self._offset += fmt.size
+        return data
+
+    def iter_unpack(self, fmt, count):
+        # count consecutive records of fmt starting at the current offset
+        return fmt.iter_unpack(self.read(fmt.size*count))
+
+    def array(self, dtype, count):
+        # copied so nothing keeps the mapping alive once parsing is done
+        data = numpy.frombuffer(self._view, dtype, count, self._offset).copy()
+        self._offset += data.nbytes
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if(whence == io.SEEK_CUR):
+            offset += self._offset
+        elif(whence == io.SEEK_END):
+            offset += len(self._view)
+        self._offset = offset
+        return self._offset
+
+    def tell(self):
+        return self._offset
+
+    def release(self):
+        self._view.release()
 
 class zeroChunk:
+    # decoded payload fields still go to __dict__, it is only created once one is set
+    __slots__ = ('_name', '_size_in_bytes', '_parent', '_offset', '_source', '_raw',
+        '_child_index', '_descendant_index', 'children', '__dict__')
 
-    def __init__(self, name='', size_in_bytes=0, parent=None):
+    def __init__(self, name='', size_in_bytes=0, parent=None, offset=None):
         self._name = name
         self._size_in_bytes = size_in_bytes
         self._parent = parent
+        self._offset = offset
+        self._source = None
+        self._raw = None
+        self._child_index = None
+        self._descendant_index = None
         self.children = None
 
+    def __getattr__(self, attr):
+        # only reached for missing attributes, deferred chunks decode themselves here
+        if(attr.startswith('_')):
+            raise AttributeError(attr)
+        if(self._source == None):
+            return self._decoded_field(attr)
+        with LAZY_LOCK:
+            source = self._source
+            if(source == None):
+                return self._decoded_field(attr)
+            # decoding is no edit
+            raw = self._raw
+            self._raw = None
+            try:
+                if(source.instrument != None):
+                    source.instrument.start_chunk(self)
+                read_payload(source.at(self._offset), self)
+                if(source.instrument != None):
+                    source.instrument.end_chunk(self)
+            except BaseException:
+                # left as it was, the next access raises the same error
+                self.__dict__.clear()
+                raise
+            finally:
+                if(raw is not None):
+                    self._raw = raw
+            # other threads see the chunk decoded once all its fields are there
+            self._source = None
+        return getattr(self, attr)
+
+    def _decoded_field(self, attr):
+        # another thread may have decoded the chunk since attr was looked up
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            raise AttributeError(attr) from None
+
+    def __setattr__(self, attr, value):
+        # setting a payload field of a chunk still holding its raw bytes is an edit
+        if(attr[0] != '_' and attr != 'children' and self._raw is not None):
+            self.touch()
+        object.__setattr__(self, attr, value)
+
     def __repr__(self):
         return 'zeroChunk({0}, {1})'.format(self._name, self._size_in_bytes, self._parent)
 
@@ -371,6 +1015,31 @@ class zeroChunk:
     def update_size(self, size):
         self._size_in_bytes = size
 
+    def fields(self):
+        # decoded payload of this chunk
+        return {key:value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+    def defer(self, source):
+        # payload is decoded from source on first attribute access
+        self._source = source
+
+    def touch(self):
+        '''Mark the chunk as edited, it and every chunk above it are written
+        from their fields again. Setting a field does this already, call it
+        after changing a field in place.'''
+        chunk = self
+        while(chunk != None):
+            chunk._raw = None
+            chunk = chunk._parent
+
+    @property
+    def raw(self):
+        '''View of the chunk as read from the file, header included, or None
+        once the chunk or one below it was edited or if it was not parsed
+        with raw set. Chunks whose payload is not decoded, unknown ids and
+        UNREAD_IDS among them, hold a copy of their bytes either way.'''
+        return self._raw
+
 
     @property
     def name(self):
@@ -384,12 +1053,72 @@ class zeroChunk:
     def parent(self):
         return self._parent
 
+    @property
+    def offset(self):
+        # offset of the chunk data in the source file, just past the 8 byte header
+        return self._offset
+
     def addChild(self, child):
         if(self.children == None):
             self.children = []
+            self._child_index = {}
         self.children.append(child)
+        self._child_index.setdefault(child.name, []).append(child)
+
+        # descendant indices and raw bytes above this chunk are stale now
+        chunk = self
+        while(chunk != None):
+            chunk._descendant_index = None
+            chunk._raw = None
+            chunk = chunk.parent
+
+    def children_from_id(self, id):
+        if(self._child_index == None):
+            return []
+        return self._child_index.get(id, [])
+
+    def descendants_from_id(self, id):
+        # every chunk below this one with the given id, in depth first order
+        if(self._descendant_index == None):
+            index = {}
+            stack = list(reversed(self.children)) if self.children else []
+            while(stack):
+                chunk = stack.pop()
+                index.setdefault(chunk.name, []).append(chunk)
+                if(chunk.children):
+                    stack.extend(reversed(chunk.children))
+            self._descendant_index = index
+        return self._descendant_index.get(id, [])
+
+    def find(self, id):
+        if(self._name == id):
+            return self
+        found = self.descendants_from_id(id)
+        return found[0] if found else None
+
+    def select(self, path):
+        '''Select chunks below this one by a path of chunk ids.
+
+        Every step matches the direct children with that id, "NAME[n]" keeps
+        only the n-th of them and "NAME[*]" (or a bare "NAME") keeps all,
+        e.g. root.select('MSH2/MODL[*]/GEOM/SEGM').
+        '''
+        selection = [self]
+        for step in path.strip('/').split('/'):
+            id, _, index = step.partition('[')
+            index = index.rstrip(']')
+            matches = []
+            for chunk in selection:
+                children = chunk.children_from_id(id)
+                if(index in ('', '*')):
+                    matches.extend(children)
+                elif(-len(children) <= int(index) < len(children)):
+                    matches.append(children[int(index)])
+            selection = matches
+        return selection
 
 class zeroAnimationData():
+    __slots__ = ('_animation_name', '_play_style', '_frame_rate', '_start_frame', '_end_frame')
 
     def __init__(self, animation_name, frame_rate, play_style, start_frame, end_frame):
         self._animation_name = animation_name
@@ -427,6 +1156,8 @@ class zeroAnimationData():
         return self._end_frame
 
 class zeroKeyFrameData():
+    __slots__ = ('_crc', '_keyframe_type', '_num_translation_frames', '_num_rotation_frames',
+        'translationDataFrames', 'rotationDataFrames')
 
     def __init__(self, 
     crc, 
@@ -464,6 +1195,7 @@ class zeroKeyFrameData():
         return self._num_rotation_frames
      
 class zeroFrame():
+    __slots__ = ('_index', '_data')
 
     def __init__(self, index, data):
         self._index = index
@@ -479,7 +1211,34 @@ class zeroFrame():
     def data(self):
         return self._data
 
+class zeroFrameColumns():
+    '''Keyframes of one bone as contiguous columns.
+
+    indices holds the frame numbers (uint32) and data the matching
+    translations (float32 Nx3) or rotations (float32 Nx4). Indexing still
+    hands out zeroFrame objects for code written against frame lists.
+    '''
+    __slots__ = ('indices', 'data')
+
+    def __init__(self, frames):
+        self.indices = numpy.ascontiguousarray(frames['index'])
+        self.data = numpy.ascontiguousarray(frames['data'])
+
+    def __repr__(self):
+        return 'zeroFrameColumns(indices={0}, data={1})\n'.format(self.indices, self.data)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        return zeroFrame(int(self.indices[index]), tuple(self.data[index].tolist()))
+
+    def __iter__(self):
+        for index in range(len(self.indices)):
+            yield self[index]
+
 class Zero_Bone():
+    __slots__ = ('_crc', '_bone_type', '_constrain', '_length1', '_length2')
 
     def __init__(self, crc, bone_type, constrain, length1, length2):
         self._crc = crc
@@ -510,6 +1269,7 @@ class Zero_Bone():
         return self._length2
 
 class Zero_Blend():
+    __slots__ = ('_crc', '_value')
 
     def __init__(self, crc, value):
         self._crc = crc
@@ -528,6 +1288,7 @@ class Zero_Blend():
         return self._value
 
 class ZeroClothCollision():
+    __slots__ = ('ob_name', 'ob_parent', 'col_type', 'x', 'y', 'z')
 
     def __init__(self, ob_name, ob_parent, col_type, x, y, z):
         self.ob_name = ob_name
@@ -538,13 +1299,209 @@ class ZeroClothCollision():
         self.z = z
 
 
-def parse(filepath):
+def map_file(filepath):
     with open(filepath, 'rb') as zero_file:
-        assert zero_file.read(4) == b'HEDR', "Invalid File"
-        zero_file.seek(-4, io.SEEK_CUR)
-        root = read_chunk(zero_file)
+        assert os.fstat(zero_file.fileno()).st_size >= 8, "Invalid File"
+        return mmap.mmap(zero_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def parse(filepath, arrays=False, lazy=False, include=None, exclude=None, instrument=None, limits=None, raw=False):
+    # a lazy or raw tree keeps the file mapped until the tree itself is freed,
+    # lazy and raw together decode only what is read and write back the rest as it was,
+    # re-save them with write_zero.write_file, writing over a mapped file crashes
+    zero_map = map_file(filepath)
+    zero_buffer = zeroBuffer(zero_map, arrays=arrays, lazy=lazy, include=include, exclude=exclude, instrument=instrument,
+        limits=limits, raw=raw)
+    if(instrument != None):
+        instrument.start_file(filepath)
+    try:
+        assert zero_buffer.read(4) == b'HEDR', "Invalid File"
+        zero_buffer.seek(0)
+        check_root(zero_buffer)
+        root = read_chunk(zero_buffer)
+    finally:
+        if(instrument != None):
+            instrument.end_file(filepath)
+        if(not lazy and not raw):
+            zero_buffer.release()
+            zero_map.close()
+    return root
+
+def check_root(file):
+    # recovering, a HEDR running past the end of the file is read up to the end, see read_subchunks
+    if(not file.sound_header(len(file._view)) and not file.limits.recover):
+        file.bad_header(None, len(file._view))
+
+def chunk_header_offsets(file, offset, size):
+    # (name, header offset, size) of the chunks laid out in [offset, offset+size)
+    headers = []
+    end = offset + size
+    while(offset < end):
+        file.seek(offset)
+        if(not file.sound_header(end)):
+            file.bad_header(None, end)
+            offset = file.tell()
+            continue
+        name, chunk_size = file.unpack(CHUNK_HEADER)
+        headers.append((name.decode('utf-8'), offset, chunk_size))
+        offset += chunk_size + 8
+    return headers
+
+def parse_model_chunks(filepath, hedr_size, msh2_offset, msh2_size, offsets, arrays, include, exclude, instrument=None,
+        limits=None):
+    # decodes a run of MODL subtrees, on a worker thread or process
+    zero_map = map_file(filepath)
+    zero_buffer = zeroBuffer(zero_map, arrays=arrays, include=include, exclude=exclude, instrument=instrument,
+        limits=limits)
+    # stand in parents so 'MSH2/...' include and exclude paths still match
+    msh2 = zeroChunk('MSH2', msh2_size, zeroChunk('HEDR', hedr_size, None, 8), msh2_offset)
+    try:
+        models = []
+        for offset in offsets:
+            zero_buffer.seek(offset)
+            models.append(read_chunk(zero_buffer, msh2))
+        return models
+    finally:
+        zero_buffer.release()
+        zero_map.close()
+
+def parse_parallel(filepath, executor=None, workers=None, chunksize=8, arrays=True, include=None, exclude=None,
+        instrument=None, limits=None):
+    '''Parse a .msh file, decoding its MODL chunks concurrently.
+
+    Everything but the MODL chunks under MSH2 is parsed as usual, then the
+    MODL subtrees are handed out chunksize at a time to executor and put
+    back into MSH2.children in file order. Without an executor, a pool of
+    workers threads decodes arrays and a pool of workers processes decodes
+    lists: list decoding is pure python and holds the GIL, so threads would
+    take turns on one core. Threads are used with an instrument, which
+    only sees the MODL chunks when they are decoded on threads. The memory
+    limit of limits applies to every batch of MODL chunks on its own.
+    '''
+    if(instrument == None):
+        return parse_models_parallel(filepath, executor, workers, chunksize, arrays, include, exclude, None, limits)
+    instrument.start_file(filepath)
+    try:
+        return parse_models_parallel(filepath, executor, workers, chunksize, arrays, include, exclude, instrument, limits)
+    finally:
+        instrument.end_file(filepath)
+
+def parse_models_parallel(filepath, executor, workers, chunksize, arrays, include, exclude, instrument, limits):
+    zero_map = map_file(filepath)
+    zero_buffer = zeroBuffer(zero_map, arrays=arrays, include=include,
+        exclude=list(exclude or ()) + ['MSH2/MODL'], instrument=instrument, limits=limits)
+    try:
+        assert zero_buffer.read(4) == b'HEDR', "Invalid File"
+        zero_buffer.seek(0)
+        check_root(zero_buffer)
+        root = read_chunk(zero_buffer)
+        hedr_size = root.size_in_bytes
+        msh2_offset = None
+        model_offsets = []
+        for name, offset, size in chunk_header_offsets(zero_buffer, 8, min(hedr_size, len(zero_map)-8)):
+            if(name == 'MSH2'):
+                msh2_offset, msh2_size = offset+8, size
+                if(zero_buffer.selects(zeroChunk(name, size, root, msh2_offset))):
+                    model_offsets = [model_offset for name, model_offset, model_size in
+                        chunk_header_offsets(zero_buffer, msh2_offset, size) if name == 'MODL']
+                break
+    finally:
+        zero_buffer.release()
+        zero_map.close()
+
+    if(not model_offsets):
         return root
 
+    batches = [model_offsets[i:i+chunksize] for i in range(0, len(model_offsets), chunksize)]
+    worker = functools.partial(parse_model_chunks, filepath, hedr_size, msh2_offset, msh2_size,
+        arrays=arrays, include=include, exclude=exclude, instrument=instrument, limits=limits)
+    if(executor == None):
+        # numpy copies the array payloads without the GIL, lists need processes
+        if(arrays or instrument != None):
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        else:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        with pool:
+            results = list(pool.map(worker, batches))
+    else:
+        results = list(executor.map(worker, batches))
+    models = [model for batch in results for model in batch if model != None]
+    if(not models):
+        return root
+
+    msh2 = root.children_from_id('MSH2')
+    if(msh2):
+        msh2 = msh2[0]
+    else: # everything else under MSH2 was left out by include
+        msh2 = zeroChunk('MSH2', msh2_size, root, msh2_offset)
+        stitch_children(root, [msh2])
+    for model in models:
+        model._parent = msh2
+    stitch_children(msh2, models)
+    return root
+
+def stitch_children(parent, chunks):
+    # merge chunks into parent.children keeping file order
+    children = sorted((parent.children or []) + chunks, key=lambda chunk: chunk.offset)
+    parent.children = None
+    parent._child_index = None
+    for child in children:
+        parent.addChild(child)
+
+def parse_stream(filepath, arrays=False, include=None, exclude=None, instrument=None, limits=None):
+    '''Walk a .msh file without building a chunk tree.
+
+    Yields (event, chunk_name, depth, offset, payload) tuples: 'start' and
+    'end' around chunks holding nested chunks, 'chunk' for every other chunk
+    with the fields its zero_id_dict handler decoded as payload (None for
+    chunks unknown to zero_id_dict). Offsets point just past the header.
+    include, exclude, instrument and limits work as they do for zeroBuffer,
+    the instrument only times chunks that are not containers.
+    '''
+    zero_map = map_file(filepath)
+    zero_buffer = zeroBuffer(zero_map, arrays=arrays, include=include, exclude=exclude, instrument=instrument,
+        limits=limits)
+    if(instrument != None):
+        instrument.start_file(filepath)
+    try:
+        assert zero_buffer.read(4) == b'HEDR', "Invalid File"
+        zero_buffer.seek(0)
+        yield from walk_chunks(zero_buffer, len(zero_map))
+    finally:
+        if(instrument != None):
+            instrument.end_file(filepath)
+        zero_buffer.release()
+        zero_map.close()
+
+def find_msh_files(source):
+    # a directory (searched recursively), a glob pattern or a list of paths
+    if(isinstance(source, (list, tuple))):
+        return list(source)
+    if(os.path.isdir(source)):
+        source = os.path.join(source, '**', '*.msh')
+    return sorted(glob.glob(source, recursive=True))
+
+def parse_batch_file(filepath, arrays=True, include=None, exclude=None, limits=None):
+    # runs in the worker processes, errors are returned rather than raised
+    try:
+        return (filepath, parse(filepath, arrays, False, include, exclude, limits=limits), None)
+    except Exception as error:
+        return (filepath, None, '{0}: {1}'.format(type(error).__name__, error))
+
+def parse_batch(source, workers=None, chunksize=4, arrays=True, include=None, exclude=None, limits=None):
+    '''Parse many .msh files on a process pool.
+
+    source is a directory, a glob pattern or a list of paths. Yields
+    (filepath, root, error) in input order as results come back, with root
+    None and error set for files that failed. workers defaults to the CPU
+    count and chunksize is how many files a worker is handed at once.
+    Results use the array mode by default so they pickle compactly. For
+    untrusted files pass limits, a zeroLimits, to bound the work per file.
+    '''
+    filepaths = find_msh_files(source)
+    worker = functools.partial(parse_batch_file, arrays=arrays, include=include, exclude=exclude, limits=limits)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(worker, filepaths, chunksize=chunksize)
+
 def print_chunk_recursive(chunk):
     print(chunk)
     if(chunk.children):
@@ -554,7 +1511,7 @@ def print_chunk_recursive(chunk):
 
 if __name__ == '__main__':
     if(len(sys.argv) == 2):
-        root = parse(sys.argv[1])
+        root = parse(sys.argv[1], include={'SKL2', 'MODL/NAME'})
         print_chunk_recursive(root)
 
         print('Debug Skeleton Data::::\n\n\n')
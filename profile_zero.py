@@ -0,0 +1,169 @@
+'''
+    Instrumentation hooks for parse_zero.
+
+    Parsing is silent by default. Pass an instrument to parse_zero.parse,
+    parse_stream or parse_parallel to watch it:
+
+        profile = profile_zero.zeroProfile(allocations=True)
+        root = parse_zero.parse(filepath, instrument=profile)
+        profile.dump_json(report_file)
+
+    An instrument is any object with the zeroInstrument methods, they are
+    called from the parsing thread for every decoded chunk.
+'''
+import sys
+import json
+import time
+import threading
+import tracemalloc
+
+try:
+    from . import parse_zero
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+
+class zeroInstrument():
+    '''No-op base, override the hooks of interest.'''
+
+    def start_file(self, filepath):
+        pass
+
+    def end_file(self, filepath):
+        pass
+
+    def start_chunk(self, chunk):
+        pass
+
+    def end_chunk(self, chunk):
+        # chunk has been decoded, its children (if any) included
+        pass
+
+    def notice(self, chunk, message):
+        # something odd but recoverable, such as an unknown chunk id
+        pass
+
+class zeroChunkLog(zeroInstrument):
+    '''Prints every decoded chunk and every notice, the old console output.'''
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def start_chunk(self, chunk):
+        print(chunk, file=self.stream or sys.stdout)
+
+    def notice(self, chunk, message):
+        print('{0}: {1}, Offset: {2}'.format(message, chunk.name, hex(chunk.offset)), file=self.stream or sys.stdout)
+
+class zeroProfile(zeroInstrument):
+    '''Per chunk id counts, bytes, decode time and allocations.
+
+    Times and allocations are exclusive, a container is only charged for
+    its own header and fields, not for its children. Bytes are counted the
+    same way, so they add up to the file size when every chunk is decoded.
+    Allocations are the traced memory still held once the chunk is decoded
+    and are only collected with allocations set, tracemalloc slows parsing
+    a lot.
+
+    callback, if given, is called with the report of each file once it
+    has been parsed. report() sums up everything seen so far. Chunks may
+    be decoded on several threads, but a profile follows one file at a
+    time, use one profile per thread to parse several files at once.
+    '''
+
+    def __init__(self, allocations=False, callback=None):
+        self.allocations = allocations
+        self.callback = callback
+        self.chunks = {}
+        self.files = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_start = 0.0
+        self._started_tracing = False
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if(stack == None):
+            stack = self._local.stack = []
+        return stack
+
+    def _memory(self):
+        return tracemalloc.get_traced_memory()[0] if self.allocations else 0
+
+    def start_file(self, filepath):
+        if(self.allocations and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+            self._started_tracing = True
+        self._local.stack = []
+        with self._lock:
+            self._file = {'chunks':{}, 'seconds':0.0, 'bytes':0, 'notices':[]}
+            self._file_start = time.perf_counter()
+
+    def end_file(self, filepath):
+        with self._lock:
+            file_stats, self._file = self._file, None
+            if(file_stats == None):
+                return
+            file_stats['seconds'] = time.perf_counter() - self._file_start
+            self.files[filepath] = file_stats
+        if(self._started_tracing):
+            tracemalloc.stop()
+            self._started_tracing = False
+        if(self.callback != None):
+            self.callback(dict(file_stats, file=filepath))
+
+    def start_chunk(self, chunk):
+        # [start time, start memory, children time, children memory]
+        self._stack().append([time.perf_counter(), self._memory(), 0.0, 0])
+
+    def end_chunk(self, chunk):
+        end_time = time.perf_counter()
+        end_memory = self._memory()
+        stack = self._stack()
+        if(not stack):
+            return
+        start_time, start_memory, child_time, child_memory = stack.pop()
+        seconds = end_time - start_time
+        allocated = end_memory - start_memory
+        if(stack):
+            stack[-1][2] += seconds
+            stack[-1][3] += allocated
+        record = (1, chunk_bytes(chunk), seconds - child_time, allocated - child_memory)
+        with self._lock:
+            add_record(self.chunks, chunk.name, record)
+            if(self._file != None):
+                add_record(self._file['chunks'], chunk.name, record)
+                self._file['bytes'] += record[1]
+
+    def notice(self, chunk, message):
+        with self._lock:
+            if(self._file != None):
+                self._file['notices'].append({'chunk':chunk.name, 'offset':chunk.offset, 'message':message})
+
+    def report(self):
+        with self._lock:
+            return {
+                'chunks':{name:dict(stats) for name, stats in sorted(self.chunks.items(),
+                    key=lambda item: item[1]['seconds'], reverse=True)},
+                'files':{filepath:dict(stats) for filepath, stats in sorted(self.files.items(),
+                    key=lambda item: item[1]['seconds'], reverse=True)},
+            }
+
+    def dump_json(self, fp, indent=1):
+        json.dump(self.report(), fp, indent=indent)
+
+def chunk_bytes(chunk):
+    # header and payload, containers only own their header (and MATL its count)
+    if(chunk.name in parse_zero.SUBCHUNK_IDS):
+        return 12 if chunk.name == 'MATL' else 8
+    return chunk.size_in_bytes + 8
+
+def add_record(table, name, record):
+    count, size, seconds, allocated = record
+    stats = table.get(name)
+    if(stats == None):
+        stats = table[name] = {'count':0, 'bytes':0, 'seconds':0.0, 'allocated':0}
+    stats['count'] += count
+    stats['bytes'] += size
+    stats['seconds'] += seconds
+    stats['allocated'] += allocated
@@ -0,0 +1,256 @@
+'''
+    Recovers the names behind unknown Zero CRCs, e.g. the bones of SKL2,
+    BLN2 and KFR3 chunks whose models are not in the file, by hashing
+    candidate names against all target CRCs at once.
+
+    Candidates come from a pattern of space separated slots, every name is
+    one alternative per slot concatenated:
+
+        python -m recover_zero --words bones.txt anim.msh
+        python -m recover_zero --pattern "bone_|hp_ @bones.txt _? l|r? #0-99?" 0x1a2b3c4d
+
+    A slot is a | separated list of alternatives, "@path" reads a wordlist
+    (one name per line, "@words" are the --words lists), "#a-b" are the
+    numbers a to b (zero padded if written as "#00-99") and a trailing ?
+    lets the slot be empty. Targets are hex CRCs or .msh files, of which
+    the CRCs with neither a model name in the file nor a name in the known
+    index are taken. Found names are reported as JSON and, with --save,
+    merged into the index import_zero looks names up in.
+
+    Every prefix is hashed once and its CRC state reused for all names
+    starting with it, the last slots are hashed in bulk with numpy and the
+    first slots are split over worker processes.
+'''
+import os
+import sys
+import json
+import argparse
+import itertools
+import concurrent.futures
+import numpy
+
+try:
+    from . import parse_zero
+    from . import msh2_crc
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+    import msh2_crc
+
+# used with --words when no --pattern is given
+DEFAULT_PATTERN = 'bone_|hp_|root_|p_|dummy? @words _? l|r|left|right|a|b? _? #0-9|#00-20?'
+
+# trailing slot combinations hashed together with numpy
+TAIL_NAMES = 4096
+
+# prefix states times tail names per numpy pass
+BATCH_ROWS = 1 << 18
+
+# tasks per worker process, smaller tasks even out slow and fast ones
+TASKS_PER_WORKER = 8
+
+def read_wordlist(path):
+    with open(path, encoding='latin-1') as wordlist:
+        return [line.strip() for line in wordlist if line.strip()]
+
+def parse_slot(text, words=()):
+    '''Alternatives of one pattern slot, case insensitive duplicates removed.'''
+    optional = text.endswith('?')
+    if(optional):
+        text = text[:-1]
+    names = [''] if optional else []
+    for alternative in text.split('|'):
+        if(alternative == '@words'):
+            names.extend(words)
+        elif(alternative.startswith('@')):
+            names.extend(read_wordlist(alternative[1:]))
+        elif(alternative.startswith('#') and '-' in alternative):
+            first, last = alternative[1:].split('-', 1)
+            width = len(first) if first.startswith('0') else 0
+            names.extend(str(number).zfill(width) for number in range(int(first), int(last)+1))
+        else:
+            names.append(alternative)
+    seen = set()
+    slot = []
+    for name in names:
+        folded = msh2_crc.fold_name(name)
+        if(folded not in seen):
+            seen.add(folded)
+            slot.append(name)
+    return slot
+
+def parse_pattern(pattern, words=()):
+    return [parse_slot(text, words) for text in pattern.split()]
+
+def count_names(slots):
+    count = 1
+    for slot in slots:
+        count *= len(slot)
+    return count
+
+class zeroNameSearch():
+    '''The names of a list of slots, hashed against a set of target CRCs.
+
+    The leading (head) slots are walked depth first, reusing the CRC state
+    of every prefix. The trailing (tail) slots are joined into one list of
+    names that numpy hashes after a batch of head states at once.
+    '''
+
+    def __init__(self, slots, targets):
+        self.slots = [list(slot) for slot in slots]
+        self.targets = numpy.unique(numpy.array(list(targets), dtype=numpy.uint32))
+        split = len(self.slots)
+        combinations = 1
+        while(split > 0 and (split == len(self.slots) or combinations*len(self.slots[split-1]) <= TAIL_NAMES)):
+            split -= 1
+            combinations *= len(self.slots[split])
+        self.head = self.slots[:split]
+        self.tail = [''.join(names) for names in itertools.product(*self.slots[split:])]
+        padded = msh2_crc.pad_names(self.tail)
+        self.tail_padded = padded.view(numpy.uint8).reshape(len(self.tail), padded.dtype.itemsize)
+
+    def tasks(self, count):
+        '''(spread, start, stop) arguments of search that split it in about count parts.'''
+        spread = 0
+        combinations = 1
+        while(spread < len(self.head) and combinations < count):
+            combinations *= len(self.head[spread])
+            spread += 1
+        step = max(1, -(-combinations//count))
+        return [(spread, start, min(start+step, combinations)) for start in range(0, combinations, step)]
+
+    def search(self, spread=0, start=0, stop=None):
+        '''(crc, name) of the matching names whose first spread slots are
+        combinations start to stop of those slots.'''
+        hits = []
+        batch = []
+        rows = max(1, BATCH_ROWS//len(self.tail))
+        states = [0xFFFFFFFF]
+        previous = ()
+        for names in itertools.islice(itertools.product(*self.head[:spread]), start, stop):
+            # product only changes the last slots from one combination to the next
+            depth = 0
+            while(depth < len(previous) and previous[depth] == names[depth]):
+                depth += 1
+            del states[depth+1:]
+            for name in names[depth:]:
+                states.append(msh2_crc.crc_extend(states[-1], name))
+            previous = names
+            self.expand(states[-1], names, spread, batch, hits, rows)
+        self.flush(batch, hits)
+        return hits
+
+    def expand(self, state, names, depth, batch, hits, rows):
+        if(depth == len(self.head)):
+            batch.append((state, names))
+            if(len(batch) >= rows):
+                self.flush(batch, hits)
+            return
+        for name in self.head[depth]:
+            self.expand(msh2_crc.crc_extend(state, name), names + (name,), depth+1, batch, hits, rows)
+
+    def flush(self, batch, hits):
+        # every tail name after every batched head state, one row per head state
+        if(not batch):
+            return
+        states = numpy.array([state for state, names in batch], dtype=numpy.uint32)
+        crcs = msh2_crc.crc_padded(self.tail_padded, states[:, None])
+        for row, column in zip(*numpy.nonzero(numpy.isin(crcs, self.targets))):
+            hits.append((int(crcs[row, column]), ''.join(batch[row][1]) + self.tail[column]))
+        batch.clear()
+
+def recover(slots, targets, workers=1):
+    '''CRCIndex of the names of slots whose CRC is one of targets.
+
+    More than one name for a CRC shows up in its collisions().
+    '''
+    found = msh2_crc.CRCIndex()
+    if(count_names(slots) == 0):
+        return found # a slot without names, there is nothing to hash
+    search = zeroNameSearch(slots, targets)
+    if(workers > 1 and search.head):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            tasks = search.tasks(workers*TASKS_PER_WORKER)
+            results = list(executor.map(search.search, *zip(*tasks)))
+    else:
+        results = [search.search()]
+    for hits in results:
+        for crc_, name in hits:
+            found.insert(crc_, name)
+    return found
+
+def unknown_crcs(filepath, known=None):
+    '''Skeleton, blend factor and keyframe CRCs of a .msh file that no model
+    name in the file, or in the known CRCIndex, hashes to.'''
+    root = parse_zero.parse(filepath, include={'SKL2', 'BLN2', 'KFR3', 'MODL/NAME'})
+    crcs = set()
+    for chunk in root.descendants_from_id('SKL2'):
+        crcs.update(int(bone.crc) for bone in chunk.bones)
+    for chunk in root.descendants_from_id('BLN2'):
+        crcs.update(int(blend.crc) for blend in chunk.values)
+    for chunk in root.descendants_from_id('KFR3'):
+        crcs.update(int(keyframes.crc) for keyframes in chunk.keyframes)
+    names = msh2_crc.CRCIndex(chunk.data for chunk in root.descendants_from_id('NAME'))
+    return sorted(crc_ for crc_ in crcs if crc_ not in names and (known == None or crc_ not in known))
+
+def parse_target(text):
+    # hex CRCs, everything else is a .msh file, directory or glob pattern
+    if(not os.path.exists(text)):
+        try:
+            return [int(text, 16)], []
+        except ValueError:
+            pass
+    return [], parse_zero.find_msh_files(text) or [text]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='recover_zero', description='Recover the names of unknown Zero CRCs.')
+    parser.add_argument('targets', nargs='+', help='hex CRCs, .msh files, directories or glob patterns')
+    parser.add_argument('--words', action='append', default=[], help='wordlist for @words, may be repeated')
+    parser.add_argument('--pattern', action='append', default=[], help='candidate pattern, may be repeated')
+    parser.add_argument('--index', default=msh2_crc.default_index_path(), help='known names, skipped as targets')
+    parser.add_argument('--save', action='store_true', help='merge the names found into --index')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--indent', type=int, default=None, help='indent the JSON report')
+    args = parser.parse_args(argv)
+
+    if(not args.pattern and not args.words):
+        parser.error('give --words or a --pattern')
+    words = [word for path in args.words for word in read_wordlist(path)]
+    patterns = []
+    for pattern in args.pattern or [DEFAULT_PATTERN]:
+        slots = parse_pattern(pattern, words)
+        if(count_names(slots) == 0):
+            empty = pattern.split()[[len(slot) for slot in slots].index(0)]
+            parser.error('slot {0!r} of pattern {1!r} has no names, is its wordlist empty?'.format(empty, pattern))
+        patterns.append(slots)
+
+    known = msh2_crc.CRCIndex.load(args.index) if os.path.exists(args.index) else msh2_crc.CRCIndex()
+    targets = set()
+    for text in args.targets:
+        crcs, filepaths = parse_target(text)
+        targets.update(crcs)
+        for filepath in filepaths:
+            targets.update(unknown_crcs(filepath, known))
+
+    found = msh2_crc.CRCIndex()
+    candidates = 0
+    for slots in patterns:
+        candidates += count_names(slots)
+        if(targets):
+            found.merge(recover(slots, targets, args.workers))
+
+    if(args.save and len(found)):
+        known.merge(found)
+        known.save(args.index)
+
+    report = {
+        'candidates':candidates,
+        'targets':len(targets),
+        'found':{'{0:08x}'.format(crc_):found.names(crc_) for crc_ in sorted(found)},
+        'missing':['{0:08x}'.format(crc_) for crc_ in sorted(targets) if crc_ not in found],
+    }
+    json.dump(report, sys.stdout, indent=args.indent)
+    sys.stdout.write('\n')
+    return 0 if len(found) == len(targets) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
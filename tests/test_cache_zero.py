@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+import cache_zero
+import parse_zero
+import zero_files
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filepath = zero_files.generated_file(self.directory.name)
+        self.cache_dir = os.path.join(self.directory.name, 'cache')
+        # no memory tier, every parse goes to the sidecars
+        self.cache = cache_zero.zeroParseCache(self.cache_dir, memory_entries=0)
+
+    def parses(self, filepath, **options):
+        # parse through the cache, and whether the file itself was parsed
+        with unittest.mock.patch.object(parse_zero, 'parse', wraps=parse_zero.parse) as parse:
+            root = self.cache.parse(filepath, **options)
+        return root, parse.called
+
+    def sidecars(self):
+        return sorted(name for name in os.listdir(self.cache_dir) if name.endswith(cache_zero.CACHE_SUFFIX))
+
+    def test_hit(self):
+        root, parsed = self.parses(self.filepath)
+        self.assertTrue(parsed)
+        self.assertEqual(len(self.sidecars()), 1)
+        cached, parsed = self.parses(self.filepath)
+        self.assertFalse(parsed)
+        self.assertEqual(zero_files.plain(cached.find('POSL').verts), zero_files.plain(root.find('POSL').verts))
+        # keyed by content, a copy hits too
+        copy = shutil.copy(self.filepath, os.path.join(self.directory.name, 'copy.msh'))
+        self.assertFalse(self.parses(copy)[1])
+        # other options are another entry
+        self.assertTrue(self.parses(self.filepath, arrays=True)[1])
+        self.assertEqual(len(self.sidecars()), 2)
+
+    def test_miss_after_version_bump(self):
+        self.parses(self.filepath)
+        with unittest.mock.patch.object(cache_zero, 'CACHE_VERSION', cache_zero.CACHE_VERSION + 1):
+            self.assertTrue(self.parses(self.filepath)[1])
+            self.assertFalse(self.parses(self.filepath)[1])
+        self.assertEqual(len(self.sidecars()), 2)
+
+    def test_damaged_sidecar_is_parsed_again(self):
+        self.parses(self.filepath)
+        sidecar, = self.sidecars()
+        zero_files.write_bytes(self.cache_dir, sidecar, b'not a pickle')
+        root, parsed = self.parses(self.filepath)
+        self.assertTrue(parsed)
+        self.assertEqual(root.name, 'HEDR')
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'no file owners to check')
+    def test_shared_dir_is_not_used(self):
+        os.makedirs(self.cache_dir)
+        os.chmod(self.cache_dir, 0o777)
+        self.assertFalse(cache_zero.private_dir(self.cache_dir))
+        root, parsed = self.parses(self.filepath)
+        self.assertTrue(parsed)
+        self.assertEqual(self.sidecars(), [])
+        # nor a link to a private one
+        private = os.path.join(self.directory.name, 'private')
+        self.assertTrue(cache_zero.private_dir(private))
+        os.rmdir(self.cache_dir)
+        os.symlink(private, self.cache_dir)
+        self.assertFalse(cache_zero.private_dir(self.cache_dir))
+
+    def test_made_private(self):
+        self.parses(self.filepath)
+        self.assertTrue(cache_zero.private_dir(self.cache_dir))
+        if(hasattr(os, 'getuid')):
+            self.assertEqual(os.stat(self.cache_dir).st_mode & 0o777, 0o700)
+
+    def test_least_recently_used_are_evicted(self):
+        filepaths = [zero_files.generated_file(self.directory.name, 'seed{0}.msh'.format(seed), seed=seed)
+            for seed in (1, 2, 3)]
+        self.parses(filepaths[0])
+        # room for two sidecars, not three
+        self.cache.max_bytes = 2.5*os.path.getsize(os.path.join(self.cache_dir, self.sidecars()[0]))
+        for filepath in filepaths[1:]:
+            # sidecars made or loaded later are used more recently
+            for sidecar in self.sidecars():
+                path = os.path.join(self.cache_dir, sidecar)
+                os.utime(path, (os.path.getmtime(path) - 10,)*2)
+            self.parses(filepath)
+        self.assertEqual(len(self.sidecars()), 2)
+        self.assertTrue(self.parses(filepaths[0])[1])
+        self.assertFalse(self.parses(filepaths[2])[1])
+
+    def test_clear(self):
+        self.parses(self.filepath)
+        self.cache.clear()
+        self.assertEqual(self.sidecars(), [])
+        self.assertTrue(self.parses(self.filepath)[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import random
+import tempfile
+import unittest
+
+import msh2_crc
+
+def random_names(count, seed=0):
+    # latin-1 names without NUL, which ends a name in crc_padded
+    rng = random.Random(seed)
+    return [''.join(chr(rng.randint(1, 255)) for i in range(rng.randint(0, 40))) for j in range(count)]
+
+class CRCTest(unittest.TestCase):
+
+    def test_known_values(self):
+        self.assertEqual(msh2_crc.crc(''), 0)
+        self.assertEqual(msh2_crc.crc('bone_a_3'), 0xea9101fb)
+
+    def test_case_is_ignored(self):
+        self.assertEqual(msh2_crc.crc('Bone_ROOT'), msh2_crc.crc('bone_root'))
+        self.assertEqual(msh2_crc.crc_bytes(b'Bone_ROOT'), msh2_crc.crc('bone_root'))
+
+    def test_all_implementations_agree(self):
+        names = random_names(3000)
+        expected = [msh2_crc.crc(name) for name in names]
+        self.assertEqual([msh2_crc.crc_bytes(name.encode('latin-1')) for name in names], expected)
+        self.assertEqual(msh2_crc.crc_many(names), expected)
+        self.assertEqual(msh2_crc.crc_many(names, vectorized=True), expected)
+        self.assertEqual(msh2_crc.crc_padded(msh2_crc.pad_names(names)).tolist(), expected)
+
+    def test_extend_continues_a_prefix(self):
+        names = random_names(200, seed=1)
+        prefix = msh2_crc.crc_extend(0xFFFFFFFF, 'prefix_')
+        states = msh2_crc.crc_padded(msh2_crc.pad_names(names), prefix)
+        for name, state in zip(names, states.tolist()):
+            self.assertEqual(msh2_crc.crc_extend(prefix, name) ^ 0xFFFFFFFF, msh2_crc.crc('prefix_' + name))
+            self.assertEqual(state, msh2_crc.crc('prefix_' + name))
+
+# two names sharing a CRC, found by a birthday search over random names
+COLLIDING = ('wc19g147', 'b_e7787n')
+
+class CRCIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_lookup(self):
+        index = msh2_crc.CRCIndex(['bone_root', b'bone_a_3', ''])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index[0xea9101fb], 'bone_a_3')
+        self.assertEqual(index.get(msh2_crc.crc('BONE_ROOT')), 'bone_root')
+        self.assertIsNone(index.get(1))
+        with self.assertRaises(KeyError):
+            index[1]
+
+    def test_spellings_of_one_name(self):
+        index = msh2_crc.CRCIndex(['Bone_Root'])
+        self.assertEqual(index.add('bone_root'), [])
+        self.assertEqual(index.names(msh2_crc.crc('bone_root')), ['Bone_Root'])
+        self.assertEqual(index.collisions(), {})
+
+    def test_collisions(self):
+        crc = msh2_crc.crc(COLLIDING[0])
+        self.assertEqual(msh2_crc.crc(COLLIDING[1]), crc)
+        index = msh2_crc.CRCIndex(['bone_root'])
+        self.assertEqual(index.update(COLLIDING), [crc])
+        # the first name added wins, the others are kept
+        self.assertEqual(index[crc], COLLIDING[0])
+        self.assertEqual(index.collisions(), {crc:list(COLLIDING)})
+        other = msh2_crc.CRCIndex([COLLIDING[1]])
+        self.assertEqual(other.merge(index), [crc])
+        self.assertEqual(other.names(crc), [COLLIDING[1], COLLIDING[0]])
+
+    def test_save_and_load(self):
+        index = msh2_crc.CRCIndex(['bone_root', 'hp_fire_\xe9'] + list(COLLIDING))
+        path = os.path.join(self.directory.name, 'names', 'crc_index.json')
+        index.save(path)
+        loaded = msh2_crc.CRCIndex.load(path)
+        self.assertEqual({crc:loaded.names(crc) for crc in loaded}, {crc:index.names(crc) for crc in index})
+        self.assertEqual(loaded.collisions(), index.collisions())
+        self.assertEqual([name for name in os.listdir(os.path.dirname(path))], ['crc_index.json'])
+
+    def test_load_name_list(self):
+        path = os.path.join(self.directory.name, 'names.txt')
+        with open(path, 'w', encoding='latin-1') as names:
+            names.write('bone_root\n\n  bone_a_3  \n')
+        index = msh2_crc.CRCIndex.load(path)
+        self.assertEqual(sorted(index[crc] for crc in index), ['bone_a_3', 'bone_root'])
+        merged = msh2_crc.CRCIndex(['bone_x'])
+        merged.merge_file(path)
+        self.assertEqual(len(merged), 3)
+        merged.merge({0x1234:'some_name'})
+        self.assertEqual(merged[0x1234], 'some_name')
+
+if __name__ == '__main__':
+    unittest.main()
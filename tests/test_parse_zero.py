@@ -0,0 +1,280 @@
+import io
+import sys
+import threading
+import concurrent.futures
+import tempfile
+import unittest
+
+import parse_zero
+import profile_zero
+import write_zero
+import zero_files
+
+RECOVER = parse_zero.zeroLimits(recover=True)
+
+class Notices(profile_zero.zeroInstrument):
+
+    def __init__(self):
+        self.notices = []
+
+    def notice(self, chunk, message):
+        self.notices.append((chunk.name, message))
+
+class LimitsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        with open(zero_files.generated_file(self.directory.name), 'rb') as file:
+            self.data = file.read()
+
+    def damaged_file(self, data):
+        return zero_files.write_bytes(self.directory.name, 'damaged.msh', data)
+
+    def test_truncated_file_raises(self):
+        filepath = self.damaged_file(self.data[:len(self.data)//2])
+        with self.assertRaises(parse_zero.zeroFormatError):
+            parse_zero.parse(filepath)
+
+    def test_truncated_file_recovers_in_every_mode(self):
+        for size in (8, 100, len(self.data)//2, len(self.data)-4):
+            filepath = self.damaged_file(self.data[:size])
+            for options in ({}, {'arrays':True}, {'lazy':True}, {'raw':True}):
+                root = parse_zero.parse(filepath, limits=RECOVER, **options)
+                self.assertEqual(root.name, 'HEDR')
+            self.assertEqual(parse_zero.parse_parallel(filepath, limits=RECOVER).name, 'HEDR')
+            for event in parse_zero.parse_stream(filepath, limits=RECOVER):
+                self.assertLessEqual(event[3], size)
+
+    def test_invalid_utf8_raises_or_is_replaced(self):
+        root = parse_zero.parse(self.damaged_file(self.data))
+        data = bytearray(self.data)
+        for id in ('NAME', 'FWGT', 'COLL', 'CYCL'):
+            chunk = root.find(id)
+            data[chunk.offset + 4] = 0xff
+        filepath = self.damaged_file(bytes(data))
+        with self.assertRaises(parse_zero.zeroFormatError):
+            parse_zero.parse(filepath)
+        instrument = Notices()
+        root = parse_zero.parse(filepath, instrument=instrument, limits=RECOVER)
+        self.assertIn('\ufffd', root.find('NAME').data)
+        self.assertEqual(sorted(name for name, message in instrument.notices if 'utf-8' in message),
+            ['COLL', 'CYCL', 'FWGT', 'NAME'])
+
+    def test_deep_nesting_raises(self):
+        filepath = self.damaged_file(zero_files.nested_chunks(3000))
+        limits = parse_zero.zeroLimits(max_bytes=1 << 20, recover=True)
+        for options in ({}, {'limits':limits}, {'lazy':True, 'limits':limits}):
+            with self.assertRaises(parse_zero.zeroFormatError):
+                parse_zero.parse(filepath, **options)
+        with self.assertRaises(parse_zero.zeroFormatError):
+            list(parse_zero.parse_stream(filepath, limits=limits))
+        with self.assertRaises(parse_zero.zeroFormatError):
+            parse_zero.parse_parallel(filepath, limits=limits)
+
+    def short_chunk_files(self):
+        # a TRAN too short for its fields read on into the NAME after it, and chunks
+        # too short for their fields or counts at the end of the file
+        chunk = zero_files.chunk
+        name = chunk(b'NAME', b'abc\x00')
+        yield 'TRAN', chunk(b'HEDR', chunk(b'MSH2', chunk(b'MODL', chunk(b'TRAN', bytes(4)), name)))
+        for id in (b'TRAN', b'POSL', b'MATL'):
+            yield id.decode(), chunk(b'HEDR', chunk(b'MSH2', chunk(b'MODL', name, chunk(id, bytes(4 if id == b'TRAN' else 0)))))
+        yield 'KFR3', chunk(b'HEDR', chunk(b'ANM2', chunk(b'KFR3')))
+
+    def test_short_chunks_raise(self):
+        for id, data in self.short_chunk_files():
+            filepath = self.damaged_file(data)
+            with self.assertRaisesRegex(parse_zero.zeroFormatError, id):
+                parse_zero.parse(filepath)
+            with self.assertRaisesRegex(parse_zero.zeroFormatError, id):
+                list(parse_zero.parse_stream(filepath))
+
+    def test_short_chunks_recover(self):
+        for id, data in self.short_chunk_files():
+            filepath = self.damaged_file(data)
+            for options in ({}, {'arrays':True}, {'raw':True}):
+                instrument = Notices()
+                root = parse_zero.parse(filepath, instrument=instrument, limits=RECOVER, **options)
+                self.assertEqual(root.find(id).fields(), {})
+                self.assertIn(id, [name for name, message in instrument.notices])
+                # left undecoded, the chunk is written back as it was
+                written = io.BytesIO()
+                write_zero.write_tree(written, root)
+                self.assertEqual(written.getvalue(), data)
+            events = list(parse_zero.parse_stream(filepath, limits=RECOVER))
+            self.assertIn(('chunk', id, None), [(event, name, payload) for event, name, depth, offset, payload in events])
+
+    def test_bytes_left_over_are_noticed(self):
+        chunk = zero_files.chunk
+        posl = chunk(b'POSL', parse_zero.U32.pack(1), bytes(12 + 8))
+        # one triangle, padded to 4 bytes, no notice for that
+        ndxt = chunk(b'NDXT', parse_zero.U32.pack(1), bytes(6 + 2))
+        filepath = self.damaged_file(chunk(b'HEDR', chunk(b'MSH2', chunk(b'MODL', chunk(b'SEGM', posl, ndxt)))))
+        instrument = Notices()
+        root = parse_zero.parse(filepath, instrument=instrument)
+        self.assertEqual(len(root.find('POSL').verts), 1)
+        self.assertEqual(len(root.find('NDXT').tris), 1)
+        self.assertEqual(instrument.notices, [('POSL', 'chunk size 24 but 16 bytes read')])
+        # nor for the padding after the string tables of FWGT and COLL
+        instrument = Notices()
+        parse_zero.parse(self.damaged_file(self.data), instrument=instrument)
+        self.assertEqual(instrument.notices, [])
+
+    def test_depth_limit(self):
+        filepath = self.damaged_file(self.data)
+        self.assertEqual(parse_zero.parse(filepath, limits=parse_zero.zeroLimits(max_depth=5)).name, 'HEDR')
+        with self.assertRaises(parse_zero.zeroFormatError):
+            parse_zero.parse(filepath, limits=parse_zero.zeroLimits(max_depth=4))
+
+class LazyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filepath = zero_files.generated_file(self.directory.name)
+
+    def test_failed_decode_keeps_the_chunk(self):
+        with open(self.filepath, 'rb') as file:
+            data = bytearray(file.read())
+        name = parse_zero.parse(self.filepath).find('NAME')
+        data[name.offset] = 0xff
+        filepath = zero_files.write_bytes(self.directory.name, 'bad_name.msh', bytes(data))
+        root = parse_zero.parse(filepath, lazy=True, raw=True)
+        for i in range(2):
+            with self.assertRaises(parse_zero.zeroFormatError):
+                root.find('NAME').data
+        self.assertIsNotNone(root.find('NAME').raw)
+        written = io.BytesIO()
+        write_zero.write_tree(written, root)
+        self.assertEqual(written.getvalue(), data)
+
+    def test_first_access_from_many_threads(self):
+        expected = [len(chunk.verts) for chunk in parse_zero.parse(self.filepath).descendants_from_id('POSL')]
+        # threads switching as often as they can, to meet inside a decode
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        for i in range(20):
+            chunks = parse_zero.parse(self.filepath, lazy=True).descendants_from_id('POSL')
+            barrier = threading.Barrier(8)
+            def counts(i):
+                barrier.wait()
+                return [len(chunk.verts) for chunk in chunks]
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                self.assertEqual(list(executor.map(counts, range(8))), [expected]*8)
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filepath = zero_files.generated_file(self.directory.name)
+
+    def stream_events(self, **options):
+        events = []
+        for event, name, depth, offset, payload in parse_zero.parse_stream(self.filepath, **options):
+            if(event == 'chunk'):
+                events.append((event, name, depth, offset, zero_files.plain(payload)))
+            else:
+                events.append((event, name, depth, offset))
+        return events
+
+    def test_events_match_the_tree(self):
+        expected = zero_files.tree_events(parse_zero.parse(self.filepath), parse_zero.SUBCHUNK_IDS)
+        self.assertEqual(self.stream_events(), expected)
+
+    def test_payloads_hold_fields_only(self):
+        for event, name, depth, offset, payload in parse_zero.parse_stream(self.filepath):
+            if(event == 'chunk' and name in parse_zero.zero_codecs and name not in parse_zero.UNREAD_IDS):
+                self.assertEqual(set(payload), {field for field, fmt in parse_zero.zero_schema[name]}, name)
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        # more models than a batch, so they are spread over the workers
+        self.filepath = zero_files.generated_file(self.directory.name, models=11)
+
+    def events(self, root):
+        return zero_files.tree_events(root, parse_zero.SUBCHUNK_IDS)
+
+    def test_matches_serial_parse(self):
+        for arrays in (False, True):
+            expected = self.events(parse_zero.parse(self.filepath, arrays=arrays))
+            # a process pool for lists, threads for arrays
+            root = parse_zero.parse_parallel(self.filepath, workers=2, chunksize=2, arrays=arrays)
+            self.assertEqual(self.events(root), expected, arrays)
+            with concurrent.futures.ThreadPoolExecutor(3) as executor:
+                root = parse_zero.parse_parallel(self.filepath, executor, chunksize=3, arrays=arrays)
+            self.assertEqual(self.events(root), expected, arrays)
+            # MODL chunks put back in place are linked to the tree
+            for chunk in zero_files.walk(root):
+                for child in chunk.children or ():
+                    self.assertIs(child.parent, chunk)
+            self.assertEqual(len(root.find('MSH2').children_from_id('MODL')),
+                len([event for event in expected if event[:2] == ('start', 'MODL')]))
+
+    def test_matches_serial_parse_selecting(self):
+        for options in ({'include':['POSL', 'MODL/NAME']}, {'exclude':['GEOM']}):
+            expected = self.events(parse_zero.parse(self.filepath, arrays=True, **options))
+            root = parse_zero.parse_parallel(self.filepath, workers=2, chunksize=2, **options)
+            self.assertEqual(self.events(root), expected, options)
+
+class SelectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filepath = zero_files.generated_file(self.directory.name)
+        self.root = parse_zero.parse(self.filepath)
+
+    def ids(self, root):
+        return {chunk.name for chunk in zero_files.walk(root)}
+
+    def fields(self, root, id):
+        return [zero_files.plain(chunk.fields()) for chunk in root.descendants_from_id(id)]
+
+    def test_include(self):
+        root = parse_zero.parse(self.filepath, include=['POSL', 'SKL2'])
+        self.assertEqual(self.fields(root, 'POSL'), self.fields(self.root, 'POSL'))
+        self.assertEqual(self.fields(root, 'SKL2'), self.fields(self.root, 'SKL2'))
+        # and the chunks walked to reach them
+        self.assertEqual(self.ids(root), {'HEDR', 'MSH2', 'MODL', 'GEOM', 'SEGM', 'POSL', 'SKL2'})
+
+    def test_include_path(self):
+        root = parse_zero.parse(self.filepath, include=['MODL/NAME'])
+        names = [chunk.data for chunk in self.root.descendants_from_id('NAME') if chunk.parent.name == 'MODL']
+        self.assertEqual([chunk.data for chunk in root.descendants_from_id('NAME')], names)
+
+    def test_include_keeps_subtrees(self):
+        root = parse_zero.parse(self.filepath, include=['CLTH'])
+        self.assertEqual(self.fields(root, 'CPOS'), self.fields(self.root, 'CPOS'))
+        self.assertNotIn('POSL', self.ids(root))
+
+    def test_exclude(self):
+        root = parse_zero.parse(self.filepath, exclude=['GEOM', 'MSH2/SINF/NAME'])
+        def kept(chunk):
+            # GEOM and everything below it are gone, the scene NAME too
+            while(chunk != None):
+                if(chunk.name == 'GEOM' or parse_zero.chunk_matches(chunk, [('SINF', 'NAME')])):
+                    return False
+                chunk = chunk.parent
+            return True
+        self.assertEqual([chunk.name for chunk in zero_files.walk(root)],
+            [chunk.name for chunk in zero_files.walk(self.root) if kept(chunk)])
+        self.assertEqual(self.fields(root, 'TRAN'), self.fields(self.root, 'TRAN'))
+
+    def test_stream_selects_the_same_chunks(self):
+        for options in ({'include':['POSL', 'MODL/NAME']}, {'exclude':['GEOM']}):
+            events = [(event, name, depth, offset, zero_files.plain(payload)) if event == 'chunk' else
+                (event, name, depth, offset) for event, name, depth, offset, payload in
+                parse_zero.parse_stream(self.filepath, **options)]
+            tree = parse_zero.parse(self.filepath, **options)
+            self.assertEqual([event for event in events if event[0] == 'chunk'],
+                [event for event in zero_files.tree_events(tree, parse_zero.SUBCHUNK_IDS) if event[0] == 'chunk'],
+                options)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import io
+import json
+import tempfile
+import unittest
+import contextlib
+
+import validate_zero
+import zero_files
+
+class ValidateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_generated_file_is_valid(self):
+        report = validate_zero.validate(zero_files.generated_file(self.directory.name))
+        self.assertEqual(report['errors'], [])
+        self.assertTrue(report['valid'])
+
+    def test_deep_nesting_is_reported(self):
+        filepath = zero_files.write_bytes(self.directory.name, 'nested.msh', zero_files.nested_chunks(3000))
+        report = validate_zero.validate(filepath)
+        self.assertFalse(report['valid'])
+        self.assertIn('nested more than', report['errors'][0]['message'])
+
+    def test_lowercase_id_is_invalid(self):
+        with open(zero_files.generated_file(self.directory.name), 'rb') as file:
+            data = zero_files.appended_chunks(file.read(), (b'modl', bytes(4)))
+        report = validate_zero.validate(zero_files.write_bytes(self.directory.name, 'lowercase.msh', data))
+        self.assertFalse(report['valid'])
+        self.assertIn('invalid chunk id modl', [error['message'] for error in report['errors']])
+
+    def test_broken_file_does_not_stop_the_batch(self):
+        nested = zero_files.write_bytes(self.directory.name, 'nested.msh', zero_files.nested_chunks(3000))
+        generated = zero_files.generated_file(self.directory.name)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = validate_zero.main([nested, generated])
+        report = json.loads(output.getvalue())
+        self.assertEqual(status, 1)
+        self.assertEqual(report['checked'], 2)
+        self.assertEqual([file['valid'] for file in report['files']], [False, True])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+import unittest
+
+import parse_zero
+import validate_zero
+import write_zero
+import zero_files
+
+class RoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        with open(zero_files.generated_file(self.directory.name), 'rb') as file:
+            # an unknown id and a DATA outside of MATD are skipped on read too
+            self.data = zero_files.appended_chunks(file.read(), (b'ZZZZ', b'\x01\x02\x03\x04'),
+                (b'DATA', bytes(range(12))))
+        self.filepath = zero_files.write_bytes(self.directory.name, 'extra.msh', self.data)
+
+    def written(self, root):
+        file = io.BytesIO()
+        write_zero.write_tree(file, root)
+        return file.getvalue()
+
+    def test_parsed_tree_writes_back_as_read(self):
+        for options in ({}, {'arrays':True}, {'lazy':True}, {'raw':True}):
+            data = self.written(parse_zero.parse(self.filepath, **options))
+            self.assertEqual(data, self.data, options)
+        filepath = zero_files.write_bytes(self.directory.name, 'written.msh', data)
+        self.assertTrue(validate_zero.validate(filepath)['valid'])
+
+    def test_edited_tree_keeps_skipped_chunks(self):
+        root = parse_zero.parse(self.filepath)
+        root.find('NAME').data = 'renamed'
+        root = parse_zero.parse(zero_files.write_bytes(self.directory.name, 'edited.msh', self.written(root)))
+        self.assertEqual(root.find('NAME').data, 'renamed')
+        for id in ('NRML', 'STRP', 'CL1L', 'ZZZZ'):
+            self.assertIsNotNone(root.find(id).raw, id)
+
+    def test_filtered_raw_tree_writes_back_whole(self):
+        root = parse_zero.parse(self.filepath, raw=True)
+        root.find('NAME').data = 'renamed'
+        expected = self.written(root)
+        for options in ({'include':['MODL/NAME']}, {'exclude':['GEOM', 'SKL2']}, {'include':['NAME'], 'lazy':True}):
+            root = parse_zero.parse(self.filepath, raw=True, **options)
+            root.find('NAME').data = 'renamed'
+            self.assertEqual(self.written(root), expected, options)
+
+    def test_resave_in_place(self):
+        for options in ({'lazy':True}, {'raw':True}, {'lazy':True, 'raw':True}):
+            filepath = zero_files.write_bytes(self.directory.name, 'in_place.msh', self.data)
+            root = parse_zero.parse(filepath, **options)
+            root.find('NAME').data = 'renamed'
+            size = write_zero.write_file(filepath, root)
+            # the old tree still reads from the replaced file
+            self.assertEqual(len(root.find('POSL').verts), len(parse_zero.parse(filepath).find('POSL').verts))
+            with open(filepath, 'rb') as file:
+                self.assertEqual(len(file.read()), size)
+            self.assertEqual(parse_zero.parse(filepath).find('NAME').data, 'renamed')
+            self.assertEqual(os.listdir(self.directory.name).count('in_place.msh'), 1)
+            self.assertEqual([name for name in os.listdir(self.directory.name) if name.endswith('.tmp')], [])
+
+class MissingFieldTest(unittest.TestCase):
+
+    def test_missing_field_raises(self):
+        tran = parse_zero.zeroChunk('TRAN', 40)
+        tran.scale = (1.0, 1.0, 1.0)
+        tran.quaternion = (0.0, 0.0, 0.0, 1.0)
+        with self.assertRaisesRegex(ValueError, 'TRAN has no location'):
+            write_zero.write_tree(io.BytesIO(), tran)
+        with self.assertRaisesRegex(ValueError, 'NAME has no data'):
+            write_zero.write_tree(io.BytesIO(), parse_zero.zeroChunk('NAME', 0))
+        with self.assertRaisesRegex(ValueError, 'ZZZZ'):
+            write_zero.write_tree(io.BytesIO(), parse_zero.zeroChunk('ZZZZ', 4))
+
+if __name__ == '__main__':
+    unittest.main()
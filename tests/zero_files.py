@@ -0,0 +1,68 @@
+'''
+    Test files for the tests in this directory, run from the add-on
+    directory with:
+
+        python -m unittest discover -s tests
+'''
+import os
+import struct
+
+import generate_zero
+
+# a few of everything the generator writes, small enough to parse in milliseconds
+SMALL = {'models':2, 'segments':1, 'vertices':64, 'bones':3, 'frames':5, 'cloth':1, 'cloth_density':4}
+
+def generated_file(directory, name='small.msh', **params):
+    filepath = os.path.join(directory, name)
+    generate_zero.generate(filepath, **dict(SMALL, **params))
+    return filepath
+
+def write_bytes(directory, name, data):
+    filepath = os.path.join(directory, name)
+    with open(filepath, 'wb') as file:
+        file.write(data)
+    return filepath
+
+def chunk(id, *payload):
+    # header and payload of one chunk, payload parts are joined
+    data = b''.join(payload)
+    return struct.pack('<4sI', id, len(data)) + data
+
+def nested_chunks(count, id=b'MODL'):
+    # a HEDR holding count chunks of id, each one inside the one before
+    data = b''
+    for i in range(count):
+        data = struct.pack('<4sI', id, len(data)) + data
+    return struct.pack('<4sI', b'HEDR', len(data)) + data
+
+def appended_chunks(data, *chunks):
+    # data of a file with (id, payload) chunks added at the end of its HEDR
+    added = b''.join(struct.pack('<4sI', id, len(payload)) + payload for id, payload in chunks)
+    return struct.pack('<4sI', b'HEDR', len(data) - 8 + len(added)) + data[8:] + added
+
+def plain(value):
+    # decoded fields as nested lists and dicts, for comparing trees decoded different ways
+    if(isinstance(value, dict)):
+        return {key:plain(item) for key, item in value.items()}
+    if(hasattr(value, 'tolist')):
+        return plain(value.tolist())
+    if(isinstance(value, (list, tuple))):
+        return [plain(item) for item in value]
+    if(hasattr(value, '__slots__')):
+        return {slot:plain(getattr(value, slot)) for slot in value.__slots__}
+    return value
+
+def walk(chunk):
+    # chunk and every chunk below it, depth first
+    yield chunk
+    for child in chunk.children or ():
+        yield from walk(child)
+
+def tree_events(chunk, subchunk_ids, depth=0):
+    # what parse_stream yields for a tree of parse, fields in place of payloads
+    if(chunk.name in subchunk_ids):
+        events = [('start', chunk.name, depth, chunk.offset)]
+        for child in chunk.children or ():
+            events += tree_events(child, subchunk_ids, depth+1)
+        return events + [('end', chunk.name, depth, chunk.offset)]
+    return [('chunk', chunk.name, depth, chunk.offset, plain(chunk.fields()))]
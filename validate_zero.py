@@ -0,0 +1,279 @@
+'''
+    Structural validator for ZeroEngine .msh files.
+
+    Only chunk headers, count fields and index columns are read, payloads
+    are never decoded into python objects. Checks chunk sizes against
+    their children and parents, 4 byte alignment, counts against payload
+    lengths and index ranges, and reports as JSON:
+
+        python -m validate_zero [--strict] [--workers N] path [path ...]
+
+    paths may be files, directories or glob patterns. The exit status is 1
+    if any file has errors (or warnings, with --strict).
+'''
+import sys
+import json
+import argparse
+import concurrent.futures
+import numpy
+
+try:
+    from . import parse_zero
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+
+# bytes per counted record, the payload is a u32 count followed by count records
+RECORD_SIZES = {id:parse_zero.zero_codecs[id][field].size for id, field in
+    (('POSL', 'verts'), ('NRML', 'normals'), ('UV0L', 'uvs'), ('NDXT', 'tris'), ('ENVL', 'envelopes'),
+    ('CPOS', 'cloth_verts'), ('CUV0', 'cloth_uvs'), ('FIDX', 'fixed_points'), ('CMSH', 'cloth_tris'),
+    ('SPRS', 'stretch_constraints'), ('CPRS', 'cross_constraints'), ('BPRS', 'bend_constraints'),
+    ('SKL2', 'bones'), ('BLN2', 'values'))}
+RECORD_SIZES['WGHT'] = 4*parse_zero.zero_codecs['WGHT']['weights'].size # four weights per vertex
+RECORD_SIZES['CYCL'] = parse_zero.CYCL_RECORD.size
+
+# counted chunks holding indices, (dtype, values per record, stride in values)
+INDEX_COLUMNS = {
+    'NDXT':(parse_zero.ARRAY_DTYPES['H'], 3, 1),
+    'ENVL':(parse_zero.ARRAY_DTYPES['I'], 1, 1),
+    'WGHT':(parse_zero.ARRAY_DTYPES['I'], 4, 2),
+    'CMSH':(parse_zero.ARRAY_DTYPES['I'], 3, 1),
+    'FIDX':(parse_zero.ARRAY_DTYPES['I'], 1, 1),
+    'SPRS':(parse_zero.ARRAY_DTYPES['H'], 2, 1),
+    'CPRS':(parse_zero.ARRAY_DTYPES['H'], 2, 1),
+    'BPRS':(parse_zero.ARRAY_DTYPES['H'], 2, 1),
+}
+
+# nesting deeper than any exporter writes, chunks below it are reported and not walked
+MAX_DEPTH = parse_zero.MAX_DEPTH
+
+class zeroValidator():
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.errors = []
+        self.warnings = []
+        self.chunk_count = 0
+
+    def error(self, node, message):
+        self.errors.append({'path':node['path'], 'offset':node['offset'], 'message':message})
+
+    def warning(self, node, message):
+        self.warnings.append({'path':node['path'], 'offset':node['offset'], 'message':message})
+
+    def report(self):
+        return {'file':self.filepath, 'valid':not self.errors, 'chunks':self.chunk_count,
+            'errors':self.errors, 'warnings':self.warnings}
+
+    def walk(self, view, start, end, path, depth=0):
+        # header summary of the chunks in [start, end), checked on the way
+        nodes = []
+        if(depth > MAX_DEPTH):
+            self.error({'path':path, 'offset':start}, 'chunks nested more than {0} deep'.format(MAX_DEPTH))
+            return nodes
+        seen = {}
+        offset = start
+        while(offset < end):
+            if(end - offset < 8):
+                self.error({'path':path, 'offset':offset}, '{0} trailing bytes after the last chunk'.format(end - offset))
+                break
+            name, size = parse_zero.CHUNK_HEADER.unpack_from(view, offset)
+            # what the parser takes for a chunk id, lowercase ids are damage to it
+            if(not parse_zero.sound_id(name)):
+                self.error({'path':path, 'offset':offset}, 'invalid chunk id {0}'.format(
+                    name.decode('ascii') if name.isalnum() else '?'))
+                break
+            name = name.decode('ascii')
+
+            index = seen.get(name, 0)
+            seen[name] = index + 1
+            node = {'name':name, 'path':'{0}/{1}[{2}]'.format(path, name, index) if path else name,
+                'offset':offset, 'size':size, 'children':[]}
+            nodes.append(node)
+            self.chunk_count += 1
+
+            data_start = offset + 8
+            data_end = data_start + size
+            if(data_end > end):
+                self.error(node, 'size {0} runs {1} bytes past its parent'.format(size, data_end - end))
+                break
+            if(size % 4):
+                self.warning(node, 'size {0} is not 4 byte aligned'.format(size))
+
+            if(name in parse_zero.SUBCHUNK_IDS):
+                if(name == 'MATL'):
+                    if(size < 4):
+                        self.error(node, 'missing material count')
+                    else:
+                        node['count'] = parse_zero.U32.unpack_from(view, data_start)[0]
+                        data_start += 4
+                node['children'] = self.walk(view, data_start, data_end, node['path'], depth+1)
+            else:
+                self.check_payload(view, node, data_start, size)
+            offset = data_end
+        return nodes
+
+    def check_payload(self, view, node, start, size):
+        name = node['name']
+        if(name in RECORD_SIZES):
+            if(size < 4):
+                self.error(node, 'missing count')
+                return
+            count = parse_zero.U32.unpack_from(view, start)[0]
+            expected = 4 + count*RECORD_SIZES[name]
+            if(expected > size):
+                self.error(node, 'count {0} needs {1} bytes, chunk has {2}'.format(count, expected, size))
+                return
+            if(size - expected >= 4):
+                self.warning(node, 'count {0} needs {1} bytes, chunk has {2}'.format(count, expected, size))
+            node['count'] = count
+            if(name in INDEX_COLUMNS and count):
+                dtype, per_record, stride = INDEX_COLUMNS[name]
+                values = numpy.frombuffer(view, dtype, count*per_record*stride, start+4)[::stride]
+                node['min'] = int(values.min())
+                node['max'] = int(values.max())
+                del values
+        elif(name in ('MATI', 'MNDX', 'MTYP')):
+            if(size < 4):
+                self.error(node, 'missing value')
+            else:
+                node['value'] = parse_zero.U32.unpack_from(view, start)[0]
+        elif(name == 'SHDW'):
+            self.check_shadow(view, node, start, size)
+        elif(name == 'KFR3'):
+            self.check_keyframes(view, node, start, size)
+
+    def check_shadow(self, view, node, start, size):
+        end = start + size
+        if(size < 4):
+            self.error(node, 'missing vertex count')
+            return
+        num_verts = parse_zero.U32.unpack_from(view, start)[0]
+        edges_start = start + 4 + num_verts*12
+        if(edges_start + 4 > end):
+            self.error(node, '{0} vertices overrun the chunk'.format(num_verts))
+            return
+        num_edges = parse_zero.U32.unpack_from(view, edges_start)[0]
+        if(edges_start + 4 + num_edges*8 > end):
+            self.error(node, '{0} edges overrun the chunk'.format(num_edges))
+            return
+        if(num_edges):
+            edges = numpy.frombuffer(view, parse_zero.ARRAY_DTYPES['H'], num_edges*4, edges_start+4).reshape(num_edges, 4)
+            if(int(edges[:, 0].max()) >= num_verts):
+                self.error(node, 'edge vertex index out of range ({0} vertices)'.format(num_verts))
+            links = edges[:, 1:3]
+            if(int(links[links != 0xFFFF].max(initial=0)) >= num_edges):
+                self.error(node, 'edge link out of range ({0} edges)'.format(num_edges))
+            del edges, links
+
+    def check_keyframes(self, view, node, start, size):
+        end = start + size
+        if(size < 4):
+            self.error(node, 'missing bone count')
+            return
+        offset = start + 4
+        for bone in range(parse_zero.U32.unpack_from(view, start)[0]):
+            if(offset + 16 > end):
+                self.error(node, 'bone {0} header overruns the chunk'.format(bone))
+                return
+            crc, keyframe_type, translations, rotations = parse_zero.KEYFRAME_HEADER.unpack_from(view, offset)
+            offset += 16 + translations*parse_zero.TRANSLATION_FRAME.size + rotations*parse_zero.ROTATION_FRAME.size
+            if(offset > end):
+                self.error(node, 'keyframes of bone {0:#x} overrun the chunk'.format(crc))
+                return
+        if(end - offset >= 4):
+            self.warning(node, '{0} bytes left after the last bone'.format(end - offset))
+
+    def check_references(self, nodes, models=0, materials=0):
+        # counts and index ranges between sibling chunks
+        for node in nodes:
+            children = {}
+            for child in node['children']:
+                children.setdefault(child['name'], child)
+            name = node['name']
+            if(name == 'MSH2'):
+                models = len([child for child in node['children'] if child['name'] == 'MODL'])
+                materials = sum(len(child['children']) for child in node['children'] if child['name'] == 'MATL')
+            elif(name == 'MATL' and 'count' in node and node['count'] != len(node['children'])):
+                self.error(node, 'count {0} but {1} materials'.format(node['count'], len(node['children'])))
+            elif(name == 'SEGM'):
+                self.check_segment(node, children, materials)
+            elif(name == 'GEOM'):
+                envl = children.get('ENVL')
+                if(envl and 'min' in envl and (envl['min'] < 1 or envl['max'] > models)):
+                    self.error(envl, 'envelope index out of range (1 to {0})'.format(models))
+                for segm in node['children']:
+                    wght = [child for child in segm['children'] if child['name'] == 'WGHT']
+                    if(wght and 'max' in wght[0] and wght[0]['max'] >= (envl or {}).get('count', 0)):
+                        self.error(wght[0], 'weight index {0} out of range ({1} envelopes)'.format(
+                            wght[0]['max'], (envl or {}).get('count', 0)))
+            elif(name == 'CLTH'):
+                self.check_counts(children, 'CPOS', ('CUV0',), ('CMSH', 'FIDX', 'SPRS', 'CPRS', 'BPRS'))
+            self.check_references(node['children'], models, materials)
+
+    def check_segment(self, node, children, materials):
+        mati = children.get('MATI')
+        if(mati and 'value' in mati and mati['value'] >= materials):
+            self.error(mati, 'material index {0} out of range ({1} materials)'.format(mati['value'], materials))
+        self.check_counts(children, 'POSL', ('NRML', 'UV0L', 'WGHT'), ('NDXT',))
+
+    def check_counts(self, children, vertex_id, per_vertex, indexed):
+        vertices = children.get(vertex_id)
+        if(not vertices or 'count' not in vertices):
+            return
+        count = vertices['count']
+        for id in per_vertex:
+            child = children.get(id)
+            if(child and 'count' in child and child['count'] != count):
+                self.error(child, 'count {0} does not match {1} vertices'.format(child['count'], count))
+        for id in indexed:
+            child = children.get(id)
+            if(child and 'max' in child and child['max'] >= count):
+                self.error(child, 'vertex index {0} out of range ({1} vertices)'.format(child['max'], count))
+
+def validate(filepath):
+    validator = zeroValidator(filepath)
+    try:
+        zero_map = parse_zero.map_file(filepath)
+    except (OSError, AssertionError, ValueError) as error:
+        validator.error({'path':'', 'offset':0}, 'cannot read file: {0}'.format(error))
+        return validator.report()
+    view = memoryview(zero_map)
+    try:
+        if(view[:4] != b'HEDR'):
+            validator.error({'path':'', 'offset':0}, 'not a .msh file')
+        else:
+            nodes = validator.walk(view, 0, len(view), '')
+            validator.check_references(nodes)
+    except Exception as error:
+        # one broken file must not cost the report of the others
+        validator.error({'path':'', 'offset':0}, 'validation failed: {0}: {1}'.format(type(error).__name__, error))
+    finally:
+        view.release()
+        zero_map.close()
+    return validator.report()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='validate_zero', description='Validate the structure of .msh files.')
+    parser.add_argument('paths', nargs='+', help='.msh files, directories or glob patterns')
+    parser.add_argument('--strict', action='store_true', help='fail on warnings too')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes')
+    parser.add_argument('--indent', type=int, default=None, help='indent the JSON report')
+    args = parser.parse_args(argv)
+
+    filepaths = []
+    for path in args.paths:
+        filepaths.extend(parse_zero.find_msh_files(path) or [path])
+
+    if(args.workers > 1):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+            reports = list(executor.map(validate, filepaths, chunksize=64))
+    else:
+        reports = [validate(filepath) for filepath in filepaths]
+
+    failed = [report for report in reports if not report['valid'] or (args.strict and report['warnings'])]
+    json.dump({'checked':len(reports), 'failed':len(failed), 'files':reports}, sys.stdout, indent=args.indent)
+    sys.stdout.write('\n')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+'''
+    Chunk writer shared by the Blender exporter and the bpy free tools.
+
+    Chunks are zeroChunk trees with the fields the readers set, every
+    chunk is encoded by the writer parse_zero.zero_schema compiles for its
+    id. Chunks the readers skip, unknown ids and UNREAD_IDS among them,
+    keep the bytes they were read with and are copied, so a parsed tree
+    writes back as it was read. Sizes must be set beforehand, see
+    zeroChunk.update_size_from_children, or by write_tree.
+
+    Chunks parsed with raw set and not edited since are copied as they
+    are too, so re-saving an edited file only encodes the edited chunks
+    and the chunks above them. Lazy and raw trees still read from the
+    mapped source file, write them with write_file, which never
+    overwrites a file in place:
+
+        root = parse_zero.parse('model.msh', lazy=True, raw=True)
+        root.find('NAME').data = 'renamed'
+        write_zero.write_file('model.msh', root)
+'''
+import io
+import os
+
+try:
+    from . import parse_zero
+except ImportError: # outside of blender, as a top level module
+    import parse_zero
+
+def write_chunk(file, chunk):
+    write_chunk_tag(file, chunk)
+    write_chunk_data(file, chunk)
+
+def write_chunk_tag(file, chunk):
+    file.write(parse_zero.CHUNK_HEADER.pack(chunk.name.encode(), chunk.size_in_bytes))
+
+def write_chunk_data(file, chunk):
+    # chunks of unknown ids have no fields, only their bytes as read can be written
+    if(chunk.name not in parse_zero.zero_id_dict):
+        raise ValueError('{0} is no known chunk and has no bytes to write'.format(chunk.name))
+    parse_zero.zero_id_dict[chunk.name][1](file, chunk)
+
+def write_recursive(file, chunk):
+    #print('Exporting: \n{0}\n'.format(chunk))
+    if(chunk.raw is not None):
+        file.write(chunk.raw)
+        return
+    write_chunk(file, chunk)
+    if(chunk.children):
+        for child in chunk.children:
+            write_recursive(file, child)
+
+def chunk_size(chunk):
+    '''Payload size of chunk as it will be written, set on every edited
+    chunk on the way. Chunks holding raw bytes keep their size.'''
+    if(chunk.raw is not None):
+        return chunk.size_in_bytes
+    data = io.BytesIO()
+    write_chunk_data(data, chunk)
+    size = data.tell()
+    if(chunk.children):
+        size += sum(chunk_size(child) + 8 for child in chunk.children)
+    chunk.update_size(size)
+    return size
+
+def write_tree(file, root):
+    # sizes first, edited chunks may have grown or shrunk
+    chunk_size(root)
+    write_recursive(file, root)
+
+def write_file(filepath, root):
+    '''write_tree of root to filepath, returns the bytes written. The tree
+    goes to a new file next to filepath first, then replaces it, so a tree
+    mapped from filepath itself reads its old contents till the end.'''
+    temp_path = '{0}.{1}.tmp'.format(filepath, os.urandom(4).hex())
+    # O_EXCL, never a file already there, and the umask sets the mode as it does for open
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with open(fd, 'wb') as file:
+            write_tree(file, root)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return root.size_in_bytes+8